@@ -1,15 +1,27 @@
-import threading
-from flask_app import app
-from cloudflared import start_cloudflared
-from config import FLASK_PORT
-from game.main import myGame
+from startup_timer import startup_timer
+from config import MULTIPROCESS, REPLAY_PATH
+from pipeline import LocalPipeline, SharedMemoryPipeline
 
 if __name__ == "__main__":
-    threading.Thread(target=lambda: app.run(host="0.0.0.0", port=FLASK_PORT, threaded=True ), daemon=True).start()
+    startup_timer.mark("imports")
 
-    cloudflared_proc, public_url = start_cloudflared()
-    
-    mygame = myGame()
+    # start receiving frames and loading the pose model (in the background) before anything else,
+    # so the model is ready by the time the configuration screen is done
+    pipeline = SharedMemoryPipeline() if MULTIPROCESS else LocalPipeline()
+    pipeline.start()
+
+    # the phone isn't needed when playing back a recording
+    cloudflared_proc = None
+    if not REPLAY_PATH:
+        from cloudflared import start_cloudflared
+        cloudflared_proc, public_url = start_cloudflared()
+        startup_timer.mark("tunnel started")
+
+    # the game (and pygame) is only imported once the slow parts are already under way
+    from game.main import myGame
+    mygame = myGame(pipeline)
     mygame.run_pygame_loop()
-        
-    cloudflared_proc.terminate()
+
+    pipeline.stop()
+    if cloudflared_proc is not None:
+        cloudflared_proc.terminate()
@@ -0,0 +1,127 @@
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+
+# Times benchmarks, saves the results as json, and compares two result files.
+#
+# Every benchmark is one function call, run a few times to warm up and then timed over many runs.
+# An optional setup function runs before every call (not timed), for things like putting
+# a new frame in the mailbox. Results keep the median (the number to compare) along with
+# the mean, p95 and fastest run, since one slow run shouldn't hide or fake a regression.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# changes smaller than this (as a fraction of the old median) are treated as noise when comparing
+NOISE = 0.10
+
+
+class BenchmarkRun:
+    def __init__(self, runs=200, warmup=10, only=None):
+        self.runs = runs
+        self.warmup = warmup
+        self.only = only
+        self.results = {}
+
+
+    # time fn(), returns the result entry (or None if the benchmark was filtered out)
+    def bench(self, name, fn, setup=None, runs=None):
+        if self.only and not any(part in name for part in self.only):
+            return None
+        runs = runs or self.runs
+
+        for _ in range(self.warmup):
+            if setup is not None:
+                setup()
+            fn()
+
+        times = np.empty(runs)
+        for i in range(runs):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            times[i] = time.perf_counter() - start
+        times *= 1000.0
+
+        result = {
+            "median_ms": round(float(np.median(times)), 4),
+            "mean_ms": round(float(times.mean()), 4),
+            "p95_ms": round(float(np.percentile(times, 95)), 4),
+            "min_ms": round(float(times.min()), 4),
+            "runs": runs,
+        }
+        self.results[name] = result
+        print(f"{name:<40} {result['median_ms']:10.3f} ms  (p95 {result['p95_ms']:.3f}, min {result['min_ms']:.3f})")
+        return result
+
+
+    # save the results with enough about the machine and commit to know what they were measured on
+    def save(self, path=None):
+        commit = git_commit()
+        if path is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"{commit}.json")
+
+        import cv2
+        import pygame
+        data = {
+            "commit": commit,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "machine": {
+                "platform": platform.platform(),
+                "processor": platform.processor() or platform.machine(),
+                "cpus": os.cpu_count(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "opencv": cv2.__version__,
+                "pygame": pygame.version.ver,
+            },
+            "results": self.results,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+        print(f"saved {path}")
+        return path
+
+
+
+# short hash of the current commit ("dirty" is added if there are uncommitted changes)
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# print the change in median time of every benchmark in two result files
+# returns the names of benchmarks that got slower by more than the noise threshold
+def compare(old_path, new_path, noise=NOISE):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{'benchmark':<40} {old['commit']:>12} {new['commit']:>12}   change")
+    slower = []
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        before = old["results"].get(name)
+        after = new["results"].get(name)
+        if before is None or after is None:
+            print(f"{name:<40} {'-' if before is None else before['median_ms']:>12} {'-' if after is None else after['median_ms']:>12}   (only in {'new' if before is None else 'old'})")
+            continue
+
+        change = (after["median_ms"] - before["median_ms"]) / before["median_ms"] if before["median_ms"] else 0.0
+        flag = ""
+        if change > noise:
+            flag = "  SLOWER"
+            slower.append(name)
+        elif change < -noise:
+            flag = "  faster"
+        print(f"{name:<40} {before['median_ms']:12.3f} {after['median_ms']:12.3f}   {100 * change:+6.1f}%{flag}")
+    return slower
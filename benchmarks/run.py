@@ -0,0 +1,254 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+# Headless benchmarks of the parts of the game that run every frame or every upload:
+# - drawing characters from poses (CharacterDraw.draw_character), with made up poses instead of YOLO
+# - moving, drawing and colliding meteors (MeteorGame.update_and_draw_meteors) with more and more meteors
+# - the configuration screen preview (Configuration._update_preview and drawing it)
+# - uploads through flask (/upload), and decoding them
+# - pose detection on the whole frame and on a region around one child (game/pose_region.py):
+#   the pose worker's own work with a stand in detector, and the real model if it can be loaded
+#
+# No camera, phone, model or window is needed (pygame uses SDL's dummy video driver).
+# Run from the project folder:
+#   python benchmarks/run.py                      run everything, save to benchmarks/results/<commit>.json
+#   python benchmarks/run.py --only meteors       only run benchmarks with "meteors" in their name
+#   python benchmarks/run.py --compare OLD NEW    compare two saved results (NEW defaults to the newest)
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import cv2
+import pygame
+from harness import BenchmarkRun, compare, ROOT, RESULTS_DIR
+from game.pose_worker import PoseResult
+from game.pose_backends import StubPoseBackend, FigureBackend
+from game.draw_character import load_sprites
+
+SCREEN_SIZE = (1920, 1080)
+CAMERA_SIZE = (1280, 720)
+METEOR_COUNTS = (10, 100, 1000, 5000)
+
+STANDING = StubPoseBackend.STANDING
+
+
+# gives a new pose every time latest() is called, with people waving their arms and moving side to side
+# (same interface as the pose worker, see game/pose_worker.py)
+class SyntheticPoseSource:
+    def __init__(self, people=1, disp_w=CAMERA_SIZE[0], disp_h=CAMERA_SIZE[1], fps=30.0):
+        self.people = people
+        self.disp_w = disp_w
+        self.disp_h = disp_h
+        self.fps = fps
+        self.seq = 0
+
+
+    def latest(self):
+        self.seq += 1
+        t = self.seq / self.fps
+        xy = np.repeat(STANDING[None], self.people, axis=0) * [self.disp_w, self.disp_h]
+        for person in range(self.people):
+            xy[person, :, 0] += (person - (self.people - 1) / 2) * 0.3 * self.disp_w + 40 * math.sin(t + person)
+            xy[person, 7:11, 1] -= 60 * (1 + math.sin(3 * t + person))      # elbows and wrists
+        conf = np.full((self.people, len(STANDING)), 0.9, dtype=np.float32)
+        return PoseResult(self.seq, xy.astype(np.float32), conf, self.disp_w, self.disp_h, time.perf_counter())
+
+
+    def stats(self):
+        return {"inference_fps": self.fps, "inference_ms": 0.0}
+
+
+
+# a camera-like frame (noise and shapes, so the jpeg is about as hard to compress and decode as a real one)
+def camera_frame(size=CAMERA_SIZE):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(60, 120, (size[1], size[0], 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (5, 5), 0)
+    cv2.rectangle(frame, (size[0] // 3, size[1] // 6), (2 * size[0] // 3, size[1]), (40, 80, 160), -1)
+    cv2.circle(frame, (size[0] // 2, size[1] // 5), size[1] // 10, (170, 150, 140), -1)
+    return frame
+
+
+def camera_jpeg(size=CAMERA_SIZE, quality=60):
+    ok, jpg = cv2.imencode(".jpg", camera_frame(size), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return jpg.tobytes()
+
+
+
+def bench_character(run, screen):
+    from game.draw_character import CharacterDraw
+
+    sprites = load_sprites()
+    for people in (1, 2):
+        source = SyntheticPoseSource(people)
+        character = CharacterDraw(screen, source, 0, 0, 1.0, 0.0, 1.0, True, sprites)
+        run.bench(f"character.draw_{people}_player", character.draw_character)
+
+
+def bench_meteors(run, screen):
+    from game.meteor_game import MeteorGame
+
+    # hitboxes away from every meteor, so collisions are checked but nobody is ever hit
+    hitboxes = [pygame.Rect(-500, -500, 60, 60), pygame.Rect(-500, -400, 60, 60)]
+    for count in METEOR_COUNTS:
+        game = MeteorGame(seed=0)
+        for _ in range(count):
+            game.spawn_meteor(screen.get_width())
+        rng = np.random.default_rng(0)
+        start_y = rng.uniform(0, screen.get_height() - 200, count).astype(np.float32)
+
+        # put every meteor back where it started, so none fall off the screen during the benchmark
+        def reset(game=game, start_y=start_y):
+            game.meteors.y[:] = start_y
+
+        run.bench(f"meteors.update_draw_{count}", lambda game=game: game.update_and_draw_meteors(screen, hitboxes), setup=reset)
+
+
+def bench_preview(run, screen):
+    from frame_mailbox import FrameMailbox
+    from jpeg_decode import EncodedFrame
+    from game.cam_configuration import Configuration
+
+    data = camera_jpeg()
+    frame = camera_frame()
+    mailbox = FrameMailbox()
+    config = Configuration(screen, mailbox)
+
+    # a new frame arrives before every preview update (as an upload, or already decoded)
+    run.bench("preview.update_encoded", config._update_preview, setup=lambda: mailbox.put(EncodedFrame(data)))
+    run.bench("preview.update_decoded", config._update_preview, setup=lambda: mailbox.put(frame))
+
+    # a whole configuration screen frame, with a new camera frame every time or the same one
+    def update_and_draw():
+        config._update_preview()
+        config._draw_preview_and_ui()
+    run.bench("preview.frame_new_camera_frame", update_and_draw, setup=lambda: mailbox.put(frame))
+    run.bench("preview.frame_same_camera_frame", update_and_draw)
+
+
+# the camera frame's background gets up to 140 in every channel, the child is brighter than 200
+FIGURE_THRESHOLD = 200
+
+
+# a camera frame with one child standing in the middle (as a bright figure), and the box around them
+def child_frame(size=CAMERA_SIZE):
+    frame = camera_frame(size)
+    box = (int(0.42 * size[0]), int(0.12 * size[1]), int(0.58 * size[0]), int(0.95 * size[1]))
+    frame[box[1]:box[3], box[0]:box[2]] = (230, 230, 250)
+    return frame, box
+
+
+def bench_pose(run):
+    from game.pose_worker import PoseWorker
+    from game.pose_region import PoseRegion
+    from config import MODEL_INPUT_SIZE
+
+    class Mailbox:
+        decode_min_side = None
+
+    frame, box = child_frame()
+    meta = {"src_w": CAMERA_SIZE[0], "src_h": CAMERA_SIZE[1]}
+
+    # the pose worker's own work (cropping, resizing, mapping keypoints back, region tracking)
+    for roi in (False, True):
+        worker = PoseWorker(FigureBackend(FIGURE_THRESHOLD), Mailbox(), 1.0, True, roi=roi)
+        # never time the regular whole frame search when timing regions
+        if roi:
+            worker.region = PoseRegion(full_every=10 ** 9)
+        run.bench(f"pose.worker_{'roi' if roi else 'full'}", lambda worker=worker: worker.process_frame(1, frame, meta))
+
+    # the model itself, on the whole frame and on the region the worker would search around the child
+    # (only if the model in config.py can be loaded)
+    from game.pose_backends import create_pose_backend
+    try:
+        backend = create_pose_backend()
+    except Exception as e:
+        print(f"pose.model_full / pose.model_roi skipped, the pose model couldn't be loaded ({e.__class__.__name__}: {e})")
+        return
+
+    region = PoseRegion()
+    w, h = CAMERA_SIZE
+    region.update(*FigureBackend(FIGURE_THRESHOLD).infer(frame), None, w, h)
+    x0, y0, x1, y1 = region.next_region(w, h)
+    scale = MODEL_INPUT_SIZE / float(max(w, h))
+    full = cv2.resize(frame, (int(round(w * scale)), int(round(h * scale))), interpolation=cv2.INTER_AREA)
+    crop = cv2.resize(frame[y0:y1, x0:x1], (int(round((x1 - x0) * scale)), int(round((y1 - y0) * scale))), interpolation=cv2.INTER_AREA)
+    run.bench("pose.model_full", lambda: backend.infer(full))
+    run.bench("pose.model_roi", lambda: backend.infer(crop))
+
+
+def bench_upload(run):
+    import flask_app
+    from jpeg_decode import frame_from
+
+    client = flask_app.app.test_client()
+    data = camera_jpeg()
+    mailbox = flask_app.frame_mailbox
+
+    def post():
+        client.post("/upload", data=data, content_type="application/octet-stream")
+
+    # uploads are stored as jpegs, and decoded when the game takes them
+    flask_app.decode_on_upload = False
+    run.bench("upload.post_lazy", post)
+
+    # decoding what the game took, at full size and at the size pose detection asks for
+    def take_and_decode(min_side):
+        _, item, meta = mailbox.get()
+        frame_from(item, meta, min_side)
+    run.bench("upload.decode_full", lambda: take_and_decode(None), setup=post)
+    run.bench("upload.decode_reduced_320", lambda: take_and_decode(320), setup=post)
+
+    # decoding as uploads arrive (the multi-process mode)
+    flask_app.decode_on_upload = True
+    mailbox.decode_min_side = None
+    run.bench("upload.post_decode_full", post)
+    mailbox.decode_min_side = 320
+    run.bench("upload.post_decode_reduced_320", post)
+    flask_app.decode_on_upload = False
+    mailbox.decode_min_side = None
+
+
+
+def newest_result():
+    paths = [os.path.join(RESULTS_DIR, name) for name in os.listdir(RESULTS_DIR) if name.endswith(".json")]
+    return max(paths, key=os.path.getmtime)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="headless benchmarks of the game's hot paths")
+    parser.add_argument("--runs", type=int, default=200, help="timed runs per benchmark")
+    parser.add_argument("--only", nargs="+", help="only run benchmarks with one of these in their name")
+    parser.add_argument("--out", help="where to save the results (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT", help="compare two saved results instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        old = args.compare[0]
+        new = args.compare[1] if len(args.compare) > 1 else newest_result()
+        slower = compare(old, new)
+        sys.exit(1 if slower else 0)
+
+    # sprites and fonts are loaded relative to the project folder
+    os.chdir(ROOT)
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+
+    run = BenchmarkRun(runs=args.runs, only=args.only)
+    bench_character(run, screen)
+    bench_meteors(run, screen)
+    bench_preview(run, screen)
+    bench_pose(run)
+    bench_upload(run)
+    run.save(args.out)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import subprocess
 import re
-import qrcode
 from config import CLOUDFLARED_PATH, FLASK_PORT
 
 
@@ -26,7 +25,9 @@ def start_cloudflared():
 
 
     # cool url regex getting and qr code generation that i can't use :(
+    # (qrcode is only imported in here, it isn't worth the startup time while this is turned off)
     """"
+    import qrcode
     url_pattern = re.compile(r"https://[a-z0-9\-]+\.trycloudflare\.com")
 
     public_url = None
@@ -1,3 +1,60 @@
 CLOUDFLARED_PATH = "C:\\Program Files (x86)\\cloudflared\\cloudflared.exe"
 FLASK_PORT = 8080
 YOLO_MODEL_PATH = "yolo_models/yolo11n-pose.pt"
+
+# what runs pose detection (see game/pose_backends.py):
+# "ultralytics" (YOLO_MODEL_PATH), "onnx" (ONNX_MODEL_PATH, no torch needed) or "stub" (no model, for testing)
+POSE_BACKEND = "ultralytics"
+ONNX_MODEL_PATH = "yolo_models/yolo11n-pose.onnx"
+
+# "onnxruntime", "opencv" (cv2.dnn), or "auto" (onnxruntime if it's installed)
+ONNX_ENGINE = "auto"
+
+# run an 8 bit copy of the onnx model (made the first time, needs onnxruntime)
+ONNX_INT8 = False
+
+# run upload/decoding and pose detection in their own processes (see pipeline.py)
+MULTIPROCESS = False
+
+# size (in pixels, on the long side) of the image given to the pose model
+# smaller is faster, larger is more accurate (tests/test4-model_input_size.py compares them)
+MODEL_INPUT_SIZE = 320
+
+# after people are found, only run pose detection on the part of the frame around them (see game/pose_region.py)
+POSE_ROI = True
+
+# extra space around the people, as a fraction of the size of the box around them
+POSE_ROI_MARGIN = 0.3
+
+# search the whole frame at least every this many frames (so new players are found)
+POSE_ROI_FULL_EVERY = 10
+
+# search the whole frame if keypoint confidence drops this much below the last whole frame's
+POSE_ROI_CONF_DROP = 0.1
+
+# save every frame the phone sends to this file (None to not record)
+RECORD_PATH = None
+
+# play frames from this recording instead of using the phone (None to use the phone)
+REPLAY_PATH = None
+
+# save every pose YOLO detects to this file (None to not record)
+POSE_RECORD_PATH = None
+
+# play poses from this pose trace instead of running YOLO (None to run YOLO), see game/pose_trace.py
+POSE_REPLAY_PATH = None
+
+# only redraw the parts of the game screen that changed each frame (faster on integrated graphics)
+DIRTY_RECT_RENDERING = True
+
+# frame rate the game tries to render at
+TARGET_FPS = 60
+
+# slow pose detection down when the game can't keep up with TARGET_FPS (see game/inference_governor.py)
+POSE_GOVERNOR = True
+
+# never slow pose detection down below this many poses a second
+POSE_MIN_FPS = 10
+
+# show how long frames take from the phone to the screen (can also be toggled with L while playing)
+LATENCY_OVERLAY = False
@@ -1,13 +1,36 @@
-from flask import Flask, render_template, request
-import numpy as np
-import cv2
+from flask import Flask, render_template, request, jsonify
+from flask_sock import Sock
+import time
+import json
+import struct
+from frame_mailbox import FrameMailbox
+from jpeg_decode import decode_jpeg, jpeg_size, EncodedFrame
+from upload_advisor import UploadAdvisor
+from frame_trace import LatencyStats
+from game.rate_meter import RateMeter
 
 app = Flask(__name__, template_folder="website", static_folder="website")
+sock = Sock(app)
 
-# these are locks that will be used to prevent overwriting
-# of frames while being uploaded/processed
-latest_frame = None
-processing = False
+# newest decoded camera frame, shared with the game
+# (the game and configuration screen read frames from here)
+frame_mailbox = FrameMailbox()
+
+# decode uploads as soon as they arrive instead of when the game takes them
+decode_on_upload = False
+
+# when set, every upload is also saved to a recording (see frame_capture.py)
+frame_recorder = None
+
+# how long decoding uploads takes, used to tell the phone what to send
+decode_meter = RateMeter()
+upload_advisor = UploadAdvisor(decode_meter)
+
+# how long frames take from arriving here to being on screen (filled in by the game, see frame_trace.py)
+latency_stats = LatencyStats()
+
+# when set, how often pose detection is allowed to run (set by the pipeline, see game/inference_governor.py)
+governor = None
 
 
 # render website
@@ -16,18 +39,91 @@ def index():
     return render_template("index.html")
 
 
+# hand a jpeg from the phone to the game
+# normally the jpeg is stored as is, and only decoded if the game actually takes it (see jpeg_decode.py)
+# when decode_on_upload is set (the multi-process mode, where this process does the decoding),
+# it's decoded straight to the smallest size the game asked for, and the frame's full size
+# is passed along so the game can still place things at full size
+# returns False for a payload that isn't a jpeg (empty, or cut off before the image size)
+def ingest_jpeg(data):
+    received = time.perf_counter()
+    if jpeg_size(data) is None:
+        return False
+    if frame_recorder is not None:
+        frame_recorder.record(data)
+
+    if not decode_on_upload:
+        frame_mailbox.put(EncodedFrame(bytes(data), decode_meter), {"received": received})
+        return True
+
+    frame, (src_w, src_h) = decode_jpeg(data, frame_mailbox.decode_min_side)
+    decoded = time.perf_counter()
+    decode_meter.tick(decoded - received)
+
+    if frame is None:
+        return False
+    frame_mailbox.put(frame, {"src_w": src_w, "src_h": src_h, "received": received, "decoded": decoded})
+    return True
+
+
 # use post to send frame to game
 @app.route("/upload", methods=["POST"])
 def upload():
-    global latest_frame, processing
+    if not ingest_jpeg(request.data):
+        return "not a jpeg", 400
+    return "OK"
 
-    if processing:
-        return "BUSY", 204
 
-    np_arr = np.frombuffer(request.data, np.uint8)
-    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+# persistent connection for streaming frames, used instead of one POST per frame when the phone supports it
+# (every POST through the tunnel pays for a whole new http request)
+#
+# phone -> server: binary messages holding one or more frames, each a 4 byte (big endian) length then the jpeg
+# server -> phone: a json ack for every message, with the current stream settings
+@sock.route("/ws")
+def frame_stream(ws):
+    received = 0
+    while True:
+        message = ws.receive()
+        if not isinstance(message, (bytes, bytearray)):
+            continue
 
-    if frame is not None:
-        latest_frame = frame
+        # only the newest frame in a message is worth decoding, the rest would be replaced right away
+        frames = split_frames(message)
+        received += len(frames)
+        if frames:
+            ingest_jpeg(frames[-1])
 
-    return "OK"
+        ws.send(json.dumps({"ack": received, "settings": upload_advisor.settings(frame_mailbox)}))
+
+
+# split a stream message into its length prefixed frames
+def split_frames(message):
+    frames = []
+    pos = 0
+    while pos + 4 <= len(message):
+        (length,) = struct.unpack_from(">I", message, pos)
+        pos += 4
+        if length == 0 or pos + length > len(message):
+            break
+        frames.append(message[pos:pos + length])
+        pos += length
+    return frames
+
+
+# the frame size, jpeg quality and upload rate the phone should use
+# (the phone checks this every few seconds, see website/js/script.js)
+@app.route("/stream_settings")
+def stream_settings():
+    return jsonify(upload_advisor.settings(frame_mailbox))
+
+
+# latency percentiles for every step from upload to screen, the frame mailbox counters,
+# and what the inference governor decided
+@app.route("/metrics")
+def metrics():
+    return jsonify({
+        "latency_ms": latency_stats.summary(),
+        "frames": frame_mailbox.stats(),
+        "decode_ms": round(decode_meter.avg_ms(), 1),
+        "governor": governor.stats() if governor is not None else None,
+    })
@@ -0,0 +1,213 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from jpeg_decode import EncodedFrame, decode_jpeg
+
+# Recording and replaying the camera stream, so the game can be run, benchmarked and tested
+# without a phone (or any camera at all).
+#
+# A recording is two files:
+# - the data file (e.g. "session.frames"): a short header, then for every frame
+#   its arrival time, its length and the jpeg bytes, written as they arrive
+# - the index file ("session.frames.idx"): one fixed size entry per frame
+#   (where the frame starts in the data file, its length, and its arrival time),
+#   so any frame can be found without reading through the whole recording
+#
+# Replaying memory maps the data file, so frames are read straight from disk as they are needed
+# instead of loading the whole recording.
+
+MAGIC = b"POSECAP1"
+RECORD_HEADER = struct.Struct("<dI")   # arrival time (seconds), jpeg length
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("timestamp", "<f8")])
+
+
+# writes every frame it's given to a recording (an existing recording at the path is replaced,
+# adding to it could leave the index and data file out of step after a crash)
+class FrameRecorder:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = open(path, "wb")
+        self._index = open(path + ".idx", "wb")
+        self._data.write(MAGIC)
+        self.frames = 0
+
+
+    # add a jpeg to the recording (timestamp defaults to now)
+    def record(self, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            offset = self._data.tell() + RECORD_HEADER.size
+            self._data.write(RECORD_HEADER.pack(timestamp, len(data)))
+            self._data.write(data)
+            entry = np.array([(offset, len(data), timestamp)], dtype=INDEX_DTYPE)
+            self._index.write(entry.tobytes())
+            self.frames += 1
+
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index.close()
+
+
+
+# a recording opened for reading
+class FrameRecording:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        self.index = self._load_index()
+
+
+    # memory map the index, or rebuild it from the data file if it's missing or doesn't match
+    def _load_index(self):
+        index_path = self.path + ".idx"
+        if os.path.exists(index_path) and os.path.getsize(index_path) > 0:
+            size = os.path.getsize(index_path)
+            if size % INDEX_DTYPE.itemsize == 0:
+                index = np.memmap(index_path, dtype=INDEX_DTYPE, mode="r", shape=(size // INDEX_DTYPE.itemsize,))
+                if self._index_matches(index):
+                    return index
+        return self._scan_index()
+
+
+    # the index matches the data file if its records follow each other with no gaps, starting right
+    # after the header and ending inside the file, and the first and last records have the lengths it says
+    def _index_matches(self, index):
+        offsets = index["offset"].astype(np.int64)
+        lengths = index["length"].astype(np.int64)
+        if offsets[0] != len(MAGIC) + RECORD_HEADER.size:
+            return False
+        if np.any(offsets[1:] != offsets[:-1] + lengths[:-1] + RECORD_HEADER.size):
+            return False
+        if offsets[-1] + lengths[-1] > len(self._mm):
+            return False
+        for i in (0, len(index) - 1):
+            _, length = RECORD_HEADER.unpack_from(self._mm, int(offsets[i]) - RECORD_HEADER.size)
+            if length != lengths[i]:
+                return False
+        return True
+
+
+    # walk through every record in the data file (used when there's no usable index)
+    def _scan_index(self):
+        entries = []
+        pos = len(MAGIC)
+        while pos + RECORD_HEADER.size <= len(self._mm):
+            timestamp, length = RECORD_HEADER.unpack_from(self._mm, pos)
+            pos += RECORD_HEADER.size
+            if pos + length > len(self._mm):
+                break
+            entries.append((pos, length, timestamp))
+            pos += length
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+
+    def __len__(self):
+        return len(self.index)
+
+
+    # the jpeg bytes of frame i (a view into the memory mapped file, not a copy)
+    def frame_data(self, i):
+        entry = self.index[i]
+        offset = int(entry["offset"])
+        return memoryview(self._mm)[offset:offset + int(entry["length"])]
+
+
+    def timestamp(self, i):
+        return float(self.index[i]["timestamp"])
+
+
+    def duration(self):
+        if len(self) < 2:
+            return 0.0
+        return self.timestamp(len(self) - 1) - self.timestamp(0)
+
+
+    def close(self):
+        self.index = None
+        try:
+            self._mm.close()
+        except BufferError:
+            # frames handed out are still in use, the mapping is released once they're gone
+            pass
+        self._file.close()
+
+
+
+# feeds a recording into a frame mailbox, in place of the phone
+# - realtime: frames are put in with the same timing they were recorded with,
+#   otherwise they're put in as fast as possible
+# - decode: frames are decoded before being put in (needed for mailboxes that hold decoded frames,
+#   like the shared memory ring), otherwise they're put in as EncodedFrames to be decoded by the game
+class ReplaySource:
+    def __init__(self, path, mailbox, realtime=True, loop=False, decode=False, speed=1.0):
+        self.recording = FrameRecording(path)
+        self.mailbox = mailbox
+        self.realtime = realtime
+        self.loop = loop
+        self.decode = decode
+        self.speed = speed
+        self.frames_sent = 0
+        self._running = False
+        self._thread = None
+        self.finished = threading.Event()
+
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self.run, name="frame-replay", daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+    # replay in the calling thread (returns when the recording ends, unless looping)
+    def run(self):
+        self._running = True
+        recording = self.recording
+        while self._running and len(recording):
+            start = time.perf_counter()
+            first = recording.timestamp(0)
+
+            for i in range(len(recording)):
+                if not self._running:
+                    break
+                if self.realtime:
+                    due = start + (recording.timestamp(i) - first) / self.speed
+                    wait = due - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                self._put(recording.frame_data(i))
+
+            if not self.loop:
+                break
+        self.finished.set()
+
+
+    # frames are traced from when they're replayed, the same as uploads from when they arrive
+    def _put(self, data):
+        received = time.perf_counter()
+        if self.decode:
+            frame, (src_w, src_h) = decode_jpeg(data, self.mailbox.decode_min_side)
+            if frame is not None:
+                meta = {"src_w": src_w, "src_h": src_h, "received": received, "decoded": time.perf_counter()}
+                self.mailbox.put(frame, meta)
+        else:
+            self.mailbox.put(EncodedFrame(data), {"received": received})
+        self.frames_sent += 1
@@ -0,0 +1,83 @@
+import threading
+import time
+
+# This is a single slot "latest wins" mailbox used to hand camera frames
+# from the upload thread (flask) to the game (configuration screen and character drawing).
+# Originally this was done with a global frame and a "processing" boolean,
+# but checking and setting a boolean from two threads is not actually a lock.
+#
+# - every put gets a new sequence number, and a newer frame simply replaces the old one
+# - consumers remember the last sequence number they saw and can block until a newer one arrives
+# - frames are handed out as is (no copying), so producers must never modify a frame after putting it
+#   and consumers must never modify a frame they were given
+# - consumers can set decode_min_side to tell the producer how big (on the long side)
+#   frames need to be, so it can decode them at a smaller size (None means full size)
+# - counters keep track of frames that were overwritten before anyone read them (dropped)
+#   and reads that found nothing new (stale)
+
+class FrameMailbox:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._meta = None
+        self._seq = 0
+        self._consumed_seq = 0
+        self.puts = 0
+        self.takes = 0
+        self.dropped = 0
+        self.stale = 0
+        self.decode_min_side = None
+
+
+    # store a new frame, replacing whatever was waiting
+    # returns the sequence number given to the frame
+    def put(self, frame, meta=None):
+        with self._cond:
+            if self._seq > self._consumed_seq:
+                self.dropped += 1
+            self._seq += 1
+            self._frame = frame
+            self._meta = meta
+            self.puts += 1
+            self._cond.notify_all()
+            return self._seq
+
+
+    # get the newest frame if it is newer than last_seq
+    # if timeout is given, wait up to that many seconds for a new frame to arrive
+    # returns (seq, frame, meta), or None if there was nothing new
+    def get(self, last_seq=0, timeout=None):
+        with self._cond:
+            if self._seq <= last_seq and timeout:
+                deadline = time.monotonic() + timeout
+                while self._seq <= last_seq:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            if self._seq <= last_seq or self._frame is None:
+                self.stale += 1
+                return None
+
+            self.takes += 1
+            self._consumed_seq = max(self._consumed_seq, self._seq)
+            return self._seq, self._frame, self._meta
+
+
+    # the sequence number of the newest frame (0 if nothing has arrived yet)
+    @property
+    def seq(self):
+        return self._seq
+
+
+    # snapshot of all counters
+    def stats(self):
+        with self._cond:
+            return {
+                "seq": self._seq,
+                "puts": self.puts,
+                "takes": self.takes,
+                "dropped": self.dropped,
+                "stale": self.stale,
+            }
@@ -0,0 +1,110 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# Tracing where the time goes between a frame arriving from the phone and the character moving on screen.
+#
+# Every frame carries a trace: the time (time.perf_counter, which every process shares) it reached each stage
+#   received   the upload arrived
+#   decoded    the jpeg was decoded (when uploads are decoded lazily this includes the time spent waiting in the mailbox)
+#   picked     pose detection took the frame
+#   inferred   pose detection finished
+#   drawn      the game drew the character with the new pose
+#   flipped    that drawing was sent to the display
+#
+# The first two travel with the frame as mailbox metadata, the rest are added to the pose result's trace.
+# Finished traces go into LatencyStats, which keeps the last few hundred and works out
+# p50/p95/p99 for every step only when someone asks (the overlay once a second, or /metrics),
+# so recording a trace is just a few array writes and can be left on all the time.
+
+STAGES = ("received", "decoded", "picked", "inferred", "drawn", "flipped")
+
+# the times reported: each stage since the one before it, and the whole way through
+STEPS = tuple(f"{a}->{b}" for a, b in zip(STAGES, STAGES[1:])) + ("total",)
+
+PERCENTILES = (50, 95, 99)
+
+
+# a trace with no stages reached yet
+def new_trace():
+    return np.full(len(STAGES), np.nan)
+
+
+# a trace with the stages a frame's metadata already has (received, decoded)
+def trace_from_meta(meta):
+    trace = new_trace()
+    for i, stage in enumerate(STAGES):
+        value = (meta or {}).get(stage)
+        if value:
+            trace[i] = value
+    return trace
+
+
+# record that the frame reached a stage (now, unless a time is given)
+def stamp(trace, stage, t=None):
+    trace[STAGES.index(stage)] = time.perf_counter() if t is None else t
+
+
+# rolling latency percentiles over the last "window" finished traces
+# name: attach to the shared memory of a LatencyStats made by another process
+# shared: create it in shared memory (so /metrics in the upload process can see the game's numbers)
+class LatencyStats:
+    def __init__(self, window=512, name=None, shared=False):
+        self.window = window
+        self._shm = None
+        self._created = False
+
+        # one int64 counter, then one row of step times (ms) per trace
+        size = 8 + window * len(STEPS) * 4
+        if name is not None:
+            self._shm = shared_memory.SharedMemory(name=name)
+            buf = self._shm.buf
+        elif shared:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._created = True
+            buf = self._shm.buf
+        else:
+            buf = bytearray(size)
+        self.name = self._shm.name if self._shm is not None else None
+
+        self._count = np.ndarray((1,), dtype=np.int64, buffer=buf)
+        self._samples = np.ndarray((window, len(STEPS)), dtype=np.float32, buffer=buf, offset=8)
+        if name is None:
+            self._count[0] = 0
+            self._samples[:] = np.nan
+
+
+    # add a finished trace
+    def record(self, trace):
+        row = int(self._count[0]) % self.window
+        self._samples[row, :-1] = np.diff(trace) * 1000.0
+        self._samples[row, -1] = (trace[-1] - trace[0]) * 1000.0
+        self._count[0] += 1
+
+
+    @property
+    def count(self):
+        return int(self._count[0])
+
+
+    # {"samples": n, "steps": {step: {"p50": ms, "p95": ms, "p99": ms}}}
+    # steps that no trace reached (e.g. received when playing a recording) are left out
+    def summary(self):
+        filled = self._samples[:min(self.count, self.window)]
+        steps = {}
+        if len(filled):
+            for i, step in enumerate(STEPS):
+                values = filled[:, i]
+                values = values[~np.isnan(values)]
+                if len(values):
+                    p = np.percentile(values, PERCENTILES)
+                    steps[step] = {f"p{q}": round(float(v), 1) for q, v in zip(PERCENTILES, p)}
+        return {"samples": self.count, "steps": steps}
+
+
+    def close(self):
+        self._count = self._samples = None
+        if self._shm is not None:
+            self._shm.close()
+            if self._created:
+                self._shm.unlink()
@@ -1,6 +1,10 @@
 import pygame
-import flask_app
 import cv2
+import math
+import numpy as np
+from game.text_cache import text_cache
+from jpeg_decode import frame_from
+from startup_timer import startup_timer
 
 # This class displays and allows for the adjustment and configuration of the input camera capture.
 # Adjustments are returned so they can be carried over into the game capture.
@@ -11,8 +15,9 @@ import cv2
 # call "configuration()" to run
 
 class Configuration:
-    def __init__(self, screen, initial_scale=1.0, initial_offx=0, initial_offy=0):
+    def __init__(self, screen, frame_source, initial_scale=1.0, initial_offx=0, initial_offy=0):
         self.screen = screen
+        self.frame_source = frame_source
         self.initial_scale = initial_scale
         self.initial_offx = initial_offx
         self.initial_offy = initial_offy
@@ -20,8 +25,18 @@ class Configuration:
         self.win_w, self.win_h = self.screen.get_size()
 
         # Preview image will be updated each loop from a live frame if available
+        # it's only rebuilt when a new frame arrives or the preview size or crop changes,
+        # and the surface (and the buffer it's filled from) are reused as long as the size stays the same
         self.preview_surf = None
         self.ph = self.pw = 0
+        self.frame_seq = 0
+        self.live_frame = None
+        self.preview_key = None
+        self.preview_rgb = None
+        self.preview_rgb_surf = None
+
+        # frames are decoded only as big as the preview needs (None until the first frame shows its size)
+        self.preview_min_side = None
 
         # Variables for slider mappings, as well as min and max values available
         self.SCALE_MIN = 0.2
@@ -36,7 +51,6 @@ class Configuration:
 
         self.dragging = None
         self.running = True
-        self.font = pygame.font.SysFont(None, 28)
         
     # This is a helper function to blit the rectangles and text of a slider to the screen
     def _draw_slider(self, surface, rect, t, label):
@@ -47,8 +61,7 @@ class Configuration:
         knob_x = int(x + 4 + (w - 8) * t)
         knob_rect = (knob_x - 6, y + h // 2 - 8, 12, 16)
         pygame.draw.rect(surface, (200, 200, 200), knob_rect)
-        font = pygame.font.SysFont(None, 20)
-        txt = font.render(f"{label}: {t:.2f}", True, (255, 255, 255))
+        txt = text_cache.render(f"{label}: {t:.2f}", 20, (255, 255, 255))
         surface.blit(txt, (x, y - 22))
 
     # This is a helper function to quickly retrieve all sliders
@@ -67,49 +80,81 @@ class Configuration:
         offy = int(round(self.t_offy * 2 * self.max_offy - self.max_offy))
         return scale, offx, offy, self.t_crop_left, self.t_crop_right
 
+    # size the preview is drawn at: the cropped frame fitted into the UI, then scaled by the scale slider
+    def _preview_size(self, crop_w, crop_h):
+        scale_val = self.SCALE_MIN + self.t_scale * (self.SCALE_MAX - self.SCALE_MIN)
+
+        # compute a base fit scale so the preview fits comfortably in the UI
+        max_preview_w = int(self.win_w * 0.8)
+        max_preview_h = int(self.win_h * 0.6)
+        base_fit = min(max_preview_w / float(crop_w), max_preview_h / float(crop_h))
+
+        final_w = max(1, int(round(crop_w * base_fit * scale_val)))
+        final_h = max(1, int(round(crop_h * base_fit * scale_val)))
+        return final_w, final_h
+
     # This function grabs a preview image of the raw camera input
     def _update_preview(self):
-        live = None
+        # the frame is shared with the rest of the program so it is only read here
+        latest = self.frame_source.get(self.frame_seq)
+        if latest is not None:
+            self.frame_seq, item, meta = latest
+            live, _ = frame_from(item, meta, self.preview_min_side)
+            if live is not None:
+                self.live_frame = live
+        if self.live_frame is None:
+            return
+
         try:
-            if flask_app.latest_frame is not None:
-                live = flask_app.latest_frame.copy()
+            live = self.live_frame
+            h, w = live.shape[:2]
+
+            # compute crop pixels
+            left_px = int(self.t_crop_left * w)
+            right_px = int(self.t_crop_right * w)
+
+            # safety clamp
+            if right_px - left_px <= 10:
+                left_px, right_px = 0, w
+            crop_w = right_px - left_px
+            final_w, final_h = self._preview_size(crop_w, h)
+
+            # nothing to do unless there's a new frame, or the crop or size changed
+            key = (self.frame_seq, left_px, right_px, final_w, final_h)
+            if key == self.preview_key:
+                return
+            self.preview_key = key
+
+            # shrink (or grow) straight to the size it's drawn at, then convert the colours at that size
+            # (INTER_AREA looks better for big reductions but is several times slower than INTER_LINEAR)
+            live = live[:, left_px:right_px]
+            interpolation = cv2.INTER_AREA if final_w < crop_w // 2 else cv2.INTER_LINEAR
+            resized = cv2.resize(live, (final_w, final_h), interpolation=interpolation)
+
+            # preview_rgb_surf shares its pixels with preview_rgb, so converting the colours into preview_rgb
+            # updates it without making a new surface. It's then copied once into a surface in the screen's
+            # format, so drawing it every frame is a plain copy instead of a conversion.
+            if self.preview_surf is None or self.preview_surf.get_size() != (final_w, final_h):
+                self.preview_rgb = np.empty((final_h, final_w, 3), np.uint8)
+                self.preview_rgb_surf = pygame.image.frombuffer(self.preview_rgb, (final_w, final_h), 'RGB')
+                self.preview_surf = pygame.Surface((final_w, final_h)).convert()
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=self.preview_rgb)
+            self.preview_surf.blit(self.preview_rgb_surf, (0, 0))
+            self.pw, self.ph = final_w, final_h
+
+            # the next frames only need decoding big enough for the cropped part to cover the preview
+            self.preview_min_side = int(math.ceil(max(final_w / float(crop_w), final_h / float(h)) * max(w, h)))
         except Exception:
-            live = None
-
-        if live is not None:
-            try:
-                h, w = live.shape[:2]
-                
-                # compute crop pixels
-                left_px = int(self.t_crop_left * w)
-                right_px = int(self.t_crop_right * w)
-                
-                # safety clamp
-                if right_px - left_px > 10:
-                    live = live[:, left_px:right_px]
-                preview = cv2.cvtColor(live, cv2.COLOR_BGR2RGB)
-                self.ph, self.pw = preview.shape[:2]
-                self.preview_surf = pygame.image.frombuffer(preview.tobytes(), (self.pw, self.ph), 'RGB')
-            except Exception:
-                self.preview_surf = None
+            self.preview_surf = None
+            self.preview_key = None
 
     # Draw ui and image preview adjusted as done by the sliders
     def _draw_preview_and_ui(self):
         self.screen.fill((30, 30, 30))
         # preview centered (if available)
         if self.preview_surf is not None and self.pw > 0 and self.ph > 0:
-            # map t_scale to real scale
-            scale_val = self.SCALE_MIN + self.t_scale * (self.SCALE_MAX - self.SCALE_MIN)
-
-            # compute a base fit scale so the preview fits comfortably in the UI
-            max_preview_w = int(self.win_w * 0.8)
-            max_preview_h = int(self.win_h * 0.6)
-            base_fit = min(max_preview_w / float(self.pw), max_preview_h / float(self.ph))
-
-            final_w = max(1, int(round(self.pw * base_fit * scale_val)))
-            final_h = max(1, int(round(self.ph * base_fit * scale_val)))
-
-            scaled = pygame.transform.smoothscale(self.preview_surf, (final_w, final_h))
+            # the preview was already made at the size it's drawn at (see _update_preview)
+            final_w, final_h = self.pw, self.ph
 
             # compute offsets in pixels from t_offx/t_offy
             max_offx_preview = self.win_w // 2
@@ -119,13 +164,13 @@ class Configuration:
 
             pv_x = (self.win_w // 2 - final_w // 2) + offx_px
             pv_y = (self.win_h // 2 - final_h // 2 - 60) + offy_px
-            self.screen.blit(scaled, (pv_x, pv_y))
+            self.screen.blit(self.preview_surf, (pv_x, pv_y))
         
         else:
             # placeholder box
             placeholder = pygame.Rect(self.win_w // 2 - 320, self.win_h // 2 - 240 - 60, 640, 480)
             pygame.draw.rect(self.screen, (50, 50, 50), placeholder)
-            no_txt = pygame.font.SysFont(None, 24).render('Waiting for camera...', True, (200, 200, 200))
+            no_txt = text_cache.render('Waiting for camera...', 24, (200, 200, 200))
             self.screen.blit(no_txt, (placeholder.x + 12, placeholder.y + 12))
 
         # get all slider rectangles available and draw them
@@ -142,9 +187,8 @@ class Configuration:
         rect_x = (self.screen.get_width() - rect_w) // 2
         rect_y = (self.screen.get_height() - rect_h) // 2 + 150
         pygame.draw.rect(self.screen, (255, 0, 0), (rect_x, rect_y, rect_w, rect_h), 4)
-        font = pygame.font.SysFont(None, 32)
         text = "Adjust settings until body fits within this region"
-        txt_surf = font.render(text, True, (255, 255, 255))
+        txt_surf = text_cache.render(text, 32, (255, 255, 255))
         txt_rect = txt_surf.get_rect(
         center=(self.screen.get_width() // 2, rect_y + rect_h + 20))
         self.screen.blit(txt_surf, txt_rect)
@@ -152,7 +196,7 @@ class Configuration:
         # draw configure button
         self.cfg_rect = pygame.Rect(self.win_w // 2 - 80, self.win_h - 70, 160, 40)
         pygame.draw.rect(self.screen, (70, 140, 70), self.cfg_rect)
-        txt = self.font.render('Configure', True, (255, 255, 255))
+        txt = text_cache.render('Configure', 28, (255, 255, 255))
         txt_rect = txt.get_rect(center=self.cfg_rect.center)
         self.screen.blit(txt, txt_rect)
 
@@ -214,4 +258,5 @@ class Configuration:
             self._draw_preview_and_ui()
 
             pygame.display.flip()
+            startup_timer.mark("first interactive frame")
             self.clock.tick(60)
\ No newline at end of file
@@ -1,16 +1,39 @@
 import pygame
 import numpy as np
-import flask_app
-import cv2
+import time
+from game.sprite_cache import SpriteTransformCache
+from game.pose_tracker import PoseTracker
+from frame_trace import stamp
 
 # This class deals with all of the motion capturing,
 # armature generation, and character drawing.
 
+# the sprite drawn over each bone of the armature
+# this dicionary can easily be changed to any sprites wanted
+# without hindering the character drawing process
+SPRITE_PATHS = {
+    "head": "sprites/head.png",
+    "left_forearm": "sprites/arm.png",
+    "right_forearm": "sprites/arm.png",
+    "left_bicep": "sprites/bicep.png",
+    "right_bicep": "sprites/bicep.png",
+    "torso": "sprites/torso.png",
+    "left_thigh": "sprites/thigh.png",
+    "right_thigh": "sprites/thigh.png",
+    "left_shin": "sprites/shin.png",
+    "right_shin": "sprites/shin.png",
+}
+
+
+# load the character sprites (after the display is set up, so they can be converted to its format)
+def load_sprites(paths=SPRITE_PATHS):
+    return {name: pygame.image.load(path).convert_alpha() for name, path in paths.items()}
+
 
 class CharacterDraw():
-    def __init__(self, screen, model, user_offx, user_offy, user_scale, crop_left, crop_right, mirror, sprites):
+    def __init__(self, screen, pose_source, user_offx, user_offy, user_scale, crop_left, crop_right, mirror, sprites, clock=time.perf_counter):
         self.screen = screen
-        self.model = model
+        self.pose_source = pose_source
         self.disp_w = None
         self.disp_h = None
         self.img_x = None
@@ -20,7 +43,6 @@ class CharacterDraw():
         self.person = None
         self.person_conf = None
         self.conf_threshold = 0.5
-        self.smoothing_alpha = .5  # higher = follow new positions more closely
         self.person = None
         self.min_conf = .5
         self.user_offx = user_offx
@@ -30,17 +52,49 @@ class CharacterDraw():
         self.crop_left = crop_left
         self.crop_right = crop_right
         self.head_rect = None
-        self.smoothed_people = []
+        self.drawn_rects = []
+        self.head_rects = {}
+        self.pose_seq = 0
+
+        # trace of the pose result first drawn this frame (None if the pose didn't change), see frame_trace.py
+        self.drawn_trace = None
+
+        # time used to predict where people are now (a replayed pose trace can supply its own clock)
+        self.clock = clock
+
+        # people are tracked between frames so each player keeps their own character
+        self.max_players = 2
+        self.tracker = PoseTracker(conf_threshold=self.conf_threshold)
+
+        # scaled and rotated sprites are reused between frames
+        self.transform_cache = SpriteTransformCache()
         
         
     # get the armature pose from YOLO and draw the character
     def draw_character(self):
         
-        # get pose will populate person with a person,
-        # so if there is not a person skip this frame
-        self.get_pose()
-        if self.person is None:
-            return
+        # everything drawn this frame (used to only update the changed parts of the screen)
+        self.drawn_rects = []
+        self.drawn_trace = None
+
+        # get pose will update the tracked people,
+        # so if there is not a person nothing is drawn this frame
+        new_result = self.get_pose()
+
+        # draw a character for every player (oldest tracked person first)
+        for track in self.get_players():
+            self.place_person(track)
+            self.head_rect = self.head_rects.get(track.id)
+            self.draw_person()
+            self.head_rects[track.id] = self.head_rect
+
+        if new_result is not None and new_result.trace is not None:
+            stamp(new_result.trace, "drawn")
+            self.drawn_trace = new_result.trace
+
+
+    # draw the character for the current person
+    def draw_person(self):
 
         # YOLO indexes points from 0-17
         # draw coresponding sprites from point 1 to point 2
@@ -67,94 +121,59 @@ class CharacterDraw():
         #        pygame.draw.circle(self.screen, (35, 111, 33), (draw_x, draw_y), 6)
         
     
-    # get the frame from the camera and convert it into a motion capture pose and points
+    # get the newest pose from the pose worker (which runs YOLO in the background)
+    # and match the detected people to the people being tracked
+    # returns the result if it's a new one, otherwise None
     def get_pose(self):
-        
-        # get frame from camera and make a copy of it to be processed
-        # "processing" is a lock to prevent overwriting during copying due to threaded programs
-        frame = None
-        if flask_app.latest_frame is not None and not flask_app.processing:
-            flask_app.processing = True
-            frame = flask_app.latest_frame.copy()
-            flask_app.latest_frame = None
-            flask_app.processing = False
-        if frame is None:
-            return
-        
 
-        # get image shape and apply offsets from configuration
+        # only process results that haven't been seen yet
+        # if there is no new result, the tracked people keep being predicted from the previous ones
+        result = self.pose_source.latest()
+        if result is None or result.seq == self.pose_seq:
+            return None
+        self.pose_seq = result.seq
+
+        self.disp_w = result.disp_w
+        self.disp_h = result.disp_h
+
+        # originally people were matched by the order YOLO returned them in, which isn't stable,
+        # so only the first person could be drawn. The tracker gives everyone a permanent id instead.
+        self.tracker.update(result.xy, result.conf, result.timestamp)
+
+        # forget head hitboxes of people that are no longer tracked
+        ids = set(track.id for track in self.tracker.tracks)
+        self.head_rects = {tid: rect for tid, rect in self.head_rects.items() if tid in ids}
+        return result
+
+
+    # the tracked people that get a character, oldest first
+    def get_players(self):
+        return sorted(self.tracker.tracks, key=lambda track: track.id)[:self.max_players]
+
+
+    # get the person's keypoints predicted for right now (between pose updates the filter
+    # extrapolates the movement, so the character moves smoothly at the full frame rate)
+    # and work out where to draw them on screen
+    def place_person(self, track):
+        now = self.clock()
+        self.person = track.filter.predict(now)
+        self.person_conf = track.conf
+
+        # take the horizontal average of all the points
         win_w, win_h = self.screen.get_size()
-        h, w = frame.shape[:2]
-        self.disp_w = max(1, int(round(w * self.user_scale)))
-        self.disp_h = max(1, int(round(h * self.user_scale)))
-        self.img_x = (win_w - self.disp_w) // 2 + self.user_offx
+        detected = (self.person_conf >= self.conf_threshold) & track.filter.seen
+        if detected.any():
+            center_x = float(np.mean(self.person[detected, 0]))
+        else:
+            center_x = float(self.disp_w) / 2.0
+
+        # translate the average points horizontal location in the capture window
+        # to the equivalent percentage of the game screen
+        desired_screen_center_x = int((center_x / float(self.disp_w)) * win_w)
+
+        # set final image pos for drawing
+        self.img_x = desired_screen_center_x - (self.disp_w // 2) + self.user_offx
         self.img_y = (win_h - self.disp_h) // 2 + self.user_offy
-        resized = cv2.resize(frame, (self.disp_w, self.disp_h))
-        if self.mirror:
-            resized = cv2.flip(resized, 1)
-
-        # run the image through YOLO pose detection
-        results = self.model(resized, verbose=False)
-
-        # if a person was detected and keypoints could be deteremined parse the results
-        if results and len(results) > 0 and getattr(results[0], 'keypoints', None) is not None:
-            kpts = results[0].keypoints
-            xy = kpts.xy.cpu().numpy()
-            conf = kpts.conf.cpu().numpy()
-            num_people = xy.shape[0]
-                
-
-            # ensure buffer count matches detected people
-            while len(self.smoothed_people) < num_people:
-                self.smoothed_people.append(xy[len(self.smoothed_people)].copy())
-
-            if len(self.smoothed_people) > num_people:
-                self.smoothed_people = self.smoothed_people[:num_people]
-
-            # process detected person from people (only draw the primary person detected)
-            for p in range(num_people):
-                self.person = xy[p]
-                self.person_conf = conf[p]
-                smoothed_person = self.smoothed_people[p]
-
-                # make a copy for smoothing
-                prev_smoothed = smoothed_person.copy()
-                detected_idxs = []
-
-                # for every index detected on the person, only save it if the confidence is high
-                # save the smoothed version, which is the average of the previous frame and the new one
-                for i in range(self.person.shape[0]):
-                    if self.person_conf[i] >= self.conf_threshold:
-                        smoothed_person[i] = (self.smoothing_alpha * self.person[i] + (1.0 - self.smoothing_alpha) * prev_smoothed[i])
-                        detected_idxs.append(i)
-
-   
-                # update smoothing buffer
-                self.smoothed_people[p] = smoothed_person
-
-                # take the horizontal average of all the points
-                if len(detected_idxs) > 0:
-                    center_x = float(np.mean(smoothed_person[detected_idxs, 0]))
-                else:
-                    center_x = float(self.disp_w) / 2.0
-
-                # translate the average points horizontal location in the capture window
-                # to the equivalent percentage of the game screen
-                desired_screen_center_x = int((center_x / float(self.disp_w)) * win_w)
-                final_img_x = desired_screen_center_x - (self.disp_w // 2) + self.user_offx
-
-                # set final image pos and current person for drawing
-                self.img_x = final_img_x
-                self.img_y = (win_h - self.disp_h) // 2 + self.user_offy
-                self.person = smoothed_person
-                self.person_conf = conf[p]
-
-                # break so only primary person is drawn
-                # this could be changed to draw multiple people
-                # initially I had it configured to draw everyone on screen (hence people variables being used)
-                # but I ran into issues of YOLO struggling to differentiate people/points
-                # when they were close in proximity or overlapping
-                break
             
             
     # draw sprite from point to other point
@@ -174,20 +193,14 @@ class CharacterDraw():
             length = max(1, np.hypot(dx, dy))
             angle = np.degrees(np.arctan2(dy, dx))
 
-            # scale the sprite based on the distance between the 2 points
-            sprite_w, sprite_h = sprite.get_size()
-            scale_factor = length / sprite_w
-            new_w = int(sprite_w * scale_factor)
-            new_h = int(sprite_h * scale_factor)
-            scaled_sprite = pygame.transform.scale(sprite, (new_w, new_h))
-
-            # rotate sprite
-            rotated_sprite = pygame.transform.rotate(scaled_sprite, -angle)
+            # scale the sprite based on the distance between the 2 points and rotate it
+            # (the cache reuses the sprite from a previous frame if the limb barely moved)
+            rotated_sprite = self.transform_cache.scaled_rotated(sprite, length, -angle)
 
             # position the sprite between the 2 points to connect them
             rect = rotated_sprite.get_rect()
             rect.center = (self.img_x + int(round((x1 + x2) / 2)), self.img_y + int(round((y1 + y2) / 2)))
-            self.screen.blit(rotated_sprite, rect.topleft)
+            self.drawn_rects.append(self.screen.blit(rotated_sprite, rect.topleft))
             
             
     # draw torso
@@ -228,13 +241,13 @@ class CharacterDraw():
             torso_height = max(1, int(abs(hip_mid_y - shoulder_mid_y)))
 
             # scale sprite to shoulders and hips
-            scaled_sprite = pygame.transform.scale(sprite, (torso_width, torso_height))
+            scaled_sprite = self.transform_cache.scaled(sprite, torso_width, torso_height)
 
             # center the sprite between the average of the shoulders and hips
             center_x = self.img_x + int(round((lh_x + rh_x + ls_x + rs_x) / 4))
             center_y = self.img_y + int(round((hip_mid_y + shoulder_mid_y) / 2))
             rect = scaled_sprite.get_rect(center=(center_x, center_y))
-            self.screen.blit(scaled_sprite, rect.topleft)
+            self.drawn_rects.append(self.screen.blit(scaled_sprite, rect.topleft))
 
             
     # this gets the center of the head
@@ -290,16 +303,22 @@ class CharacterDraw():
 
         # scale the head based on how far apart the shoulders are
         head_size = int(shoulder_width * 1.5)
-        head_sprite_scaled = pygame.transform.smoothscale(head_sprite, (head_size, head_size))
+        head_sprite_scaled = self.transform_cache.scaled(head_sprite, head_size, head_size, smooth=True)
         self.head_rect = head_sprite_scaled.get_rect()
         self.head_rect.center = (self.img_x + int(cx), self.img_y + int(cy))
-        self.screen.blit(head_sprite_scaled, self.head_rect.topleft)
+        self.drawn_rects.append(self.screen.blit(head_sprite_scaled, self.head_rect.topleft))
 
 
 
-    # returns the head rectangle to be used as a hitbox by games
+    # returns the head rectangle of the first player to be used as a hitbox by games
     def get_head_rect(self):
-        return self.head_rect
+        rects = self.get_head_rects()
+        return rects[0] if rects else None
+
+
+    # returns the head rectangles of every player
+    def get_head_rects(self):
+        return [self.head_rects[track.id] for track in self.get_players() if self.head_rects.get(track.id) is not None]
     
     
     # if there is confidence in the shoulders get the width that the shoulders are apart
@@ -0,0 +1,107 @@
+import numpy as np
+
+# Stores every falling meteor as columns of numpy arrays (one array per attribute)
+# instead of one dictionary per meteor. Moving, animating, collision checks and removing
+# off screen meteors are then done for all meteors at once, which keeps the game fast
+# even with hundreds of things falling.
+#
+# Only the first "count" entries of each array are real meteors,
+# the arrays grow (doubling in size) when they fill up.
+
+GOOD = 0
+BAD = 1
+
+
+class MeteorStore:
+
+    # attribute name -> numpy type
+    FIELDS = {
+        "x": np.float32,
+        "y": np.float32,
+        "speed": np.float32,
+        "radius": np.float32,
+        "type": np.int8,
+        "bucket": np.int16,         # which pre-scaled size the meteor uses
+        "frame": np.int8,           # current animation frame
+        "last_flicker": np.int64,   # time (ms) of the last animation frame change
+    }
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self._capacity = capacity
+        self._arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.FIELDS.items()}
+
+
+    def __len__(self):
+        return self.count
+
+
+    # the live part of an attribute's array (a view, so it can be changed in place)
+    def __getattr__(self, name):
+        arrays = self.__dict__.get("_arrays")
+        if arrays is not None and name in arrays:
+            return arrays[name][:self.count]
+        raise AttributeError(name)
+
+
+    def add(self, x, y, speed, radius, meteor_type, bucket, now):
+        if self.count == self._capacity:
+            self._grow()
+        i = self.count
+        values = {"x": x, "y": y, "speed": speed, "radius": radius, "type": meteor_type,
+                  "bucket": bucket, "frame": 0, "last_flicker": now}
+        for name, value in values.items():
+            self._arrays[name][i] = value
+        self.count += 1
+
+
+    def _grow(self):
+        self._capacity *= 2
+        for name, arr in self._arrays.items():
+            bigger = np.zeros(self._capacity, dtype=arr.dtype)
+            bigger[:self.count] = arr[:self.count]
+            self._arrays[name] = bigger
+
+
+    # move every meteor down by its speed
+    def move(self):
+        self.y[:] += self.speed
+
+
+    # step the animation frame of every meteor whose flicker time is up
+    # frames_per_type gives how many animation frames each type has
+    def animate(self, now, interval, frames_per_type):
+        frame_counts = np.asarray(frames_per_type, dtype=np.int8)[self.type]
+        due = (now - self.last_flicker > interval) & (frame_counts > 1)
+        if due.any():
+            frames = self.frame
+            frames[due] = (frames[due] + 1) % frame_counts[due]
+            self.last_flicker[due] = now
+
+
+    # which meteors overlap the rectangle (meteors are circles starting at x, y with the given radius)
+    def collide_rect(self, rect):
+        cx = self.x + self.radius
+        cy = self.y + self.radius
+
+        # closest point of the rectangle to each circle center
+        closest_x = np.clip(cx, rect.left, rect.right)
+        closest_y = np.clip(cy, rect.top, rect.bottom)
+        dx = cx - closest_x
+        dy = cy - closest_y
+        return (dx * dx + dy * dy) < (self.radius * self.radius)
+
+
+    # keep only the meteors where keep is True
+    def keep(self, keep):
+        n = int(np.count_nonzero(keep))
+        if n == self.count:
+            return
+        for name, arr in self._arrays.items():
+            arr[:n] = arr[:self.count][keep]
+        self.count = n
+
+
+    # throw away meteors that have fallen below the bottom of the screen
+    def cull(self, screen_height):
+        self.keep(self.y - self.radius < screen_height)
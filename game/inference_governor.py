@@ -0,0 +1,148 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from config import TARGET_FPS, POSE_MIN_FPS, POSE_GOVERNOR
+
+# Keeps the game rendering at its target frame rate by slowing pose detection down when it has to.
+#
+# Pose detection runs beside the render loop (in a thread, or another process on the same few cores),
+# so on a slow laptop every inference takes time away from rendering. The game tells the governor how long
+# each frame took to draw (not counting the wait for the next frame), and twice a second it picks
+# the shortest time allowed between the starts of two inferences:
+#   render over budget   frames take more than 85% of the frame budget, so allow fewer inferences (down to POSE_MIN_FPS)
+#   headroom             frames take less than 60% of the budget, so allow more (up to as fast as frames arrive)
+#   holding              somewhere in between, leave it alone (so it doesn't swing back and forth)
+# The pose worker waits out the rest of the interval before taking the next frame.
+# On a fast desktop frames never get near the budget, so the interval stays at 0 and nothing changes.
+#
+# The numbers live in one small array, which can be in shared memory so the inference
+# and upload processes see the game's decisions (same idea as LatencyStats in frame_trace.py).
+# name: attach to the shared memory of a governor made by another process
+# shared: create it in shared memory
+
+STATES = ("starting", "holding", "render over budget", "headroom")
+
+# slots in the array
+_INTERVAL_MS = 0
+_RENDER_MS = 1
+_INFERENCE_MS = 2
+_TARGET_FPS = 3
+_MIN_FPS = 4
+_ENABLED = 5
+_STATE = 6
+_ADJUSTMENTS = 7
+_FIELDS = 8
+
+
+class InferenceGovernor:
+    def __init__(self, target_fps=TARGET_FPS, min_fps=POSE_MIN_FPS, enabled=POSE_GOVERNOR, name=None, shared=False, adjust_every=0.5):
+        self.adjust_every = adjust_every
+        self._shm = None
+        self._created = False
+        self._last_adjust = time.perf_counter()
+
+        size = _FIELDS * 8
+        if name is not None:
+            self._shm = shared_memory.SharedMemory(name=name)
+            buf = self._shm.buf
+        elif shared:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._created = True
+            buf = self._shm.buf
+        else:
+            buf = bytearray(size)
+        self.name = self._shm.name if self._shm is not None else None
+
+        self._values = np.ndarray((_FIELDS,), dtype=np.float64, buffer=buf)
+        if name is None:
+            self._values[:] = 0.0
+            self._values[_TARGET_FPS] = target_fps
+            self._values[_MIN_FPS] = min_fps
+            self._values[_ENABLED] = enabled
+
+
+    # shortest time (ms) between the starts of two inferences (0 for no limit)
+    @property
+    def interval_ms(self):
+        return float(self._values[_INTERVAL_MS])
+
+
+    # called by the game every frame with how long the frame took to update and draw (seconds)
+    def render_tick(self, duration, now=None):
+        values = self._values
+        ms = 1000.0 * duration
+        values[_RENDER_MS] = ms if values[_RENDER_MS] == 0 else 0.9 * values[_RENDER_MS] + 0.1 * ms
+
+        now = time.perf_counter() if now is None else now
+        if now - self._last_adjust >= self.adjust_every:
+            self._last_adjust = now
+            if values[_ENABLED]:
+                self.adjust()
+
+
+    # called by the pose worker after every inference (seconds)
+    def inference_tick(self, duration):
+        values = self._values
+        ms = 1000.0 * duration
+        values[_INFERENCE_MS] = ms if values[_INFERENCE_MS] == 0 else 0.8 * values[_INFERENCE_MS] + 0.2 * ms
+
+
+    # pick a new interval from the latest render and inference times
+    def adjust(self):
+        values = self._values
+        budget = 1000.0 / values[_TARGET_FPS]
+        render_ms = values[_RENDER_MS]
+        inference_ms = values[_INFERENCE_MS]
+        interval = values[_INTERVAL_MS]
+
+        if render_ms > 0.85 * budget:
+            # an interval shorter than an inference does nothing, so start cutting from the inference time
+            longest = 1000.0 / values[_MIN_FPS]
+            new_interval = min(longest, max(interval, inference_ms) * 1.25)
+            state = "render over budget"
+        elif render_ms < 0.6 * budget and interval > 0:
+            new_interval = interval * 0.8
+            if new_interval <= inference_ms:
+                new_interval = 0.0
+            state = "headroom"
+        else:
+            new_interval = interval
+            state = "holding"
+
+        if new_interval != interval:
+            values[_ADJUSTMENTS] += 1
+        values[_INTERVAL_MS] = new_interval
+        values[_STATE] = STATES.index(state)
+
+
+    # seconds the pose worker should wait before starting an inference, given when it started the last one
+    def delay(self, last_start, now=None):
+        interval = self.interval_ms
+        if interval <= 0:
+            return 0.0
+        now = time.perf_counter() if now is None else now
+        return max(0.0, last_start + interval / 1000.0 - now)
+
+
+    # what the governor is doing, for the window title, the latency overlay and /metrics
+    def stats(self):
+        values = self._values
+        interval = float(values[_INTERVAL_MS])
+        return {
+            "enabled": bool(values[_ENABLED]),
+            "state": STATES[int(values[_STATE])],
+            "target_fps": float(values[_TARGET_FPS]),
+            "render_ms": round(float(values[_RENDER_MS]), 2),
+            "inference_ms": round(float(values[_INFERENCE_MS]), 2),
+            "interval_ms": round(interval, 1),
+            "inference_cap_fps": round(1000.0 / interval, 1) if interval > 0 else None,
+            "adjustments": int(values[_ADJUSTMENTS]),
+        }
+
+
+    def close(self):
+        self._values = None
+        if self._shm is not None:
+            self._shm.close()
+            if self._created:
+                self._shm.unlink()
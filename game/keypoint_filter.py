@@ -0,0 +1,87 @@
+import math
+import numpy as np
+
+# Smooths a person's keypoints and predicts where they are between pose updates.
+#
+# The phone only sends about 10 frames a second, while the game draws 60,
+# so drawing the raw (or simply averaged) keypoints makes the character lag and then jump.
+# This is a One-Euro filter (an exponential average whose smoothing changes with speed):
+# - when a keypoint is barely moving it is smoothed heavily, which removes jitter
+# - when it moves fast it is smoothed lightly, which removes lag
+# The filter also tracks each keypoint's velocity, so at draw time the keypoints
+# can be pushed forward to "now" instead of being drawn where they were at the last update.
+#
+# All 17 keypoints are filtered at once with numpy.
+
+class OneEuroKeypointFilter:
+    def __init__(self, min_cutoff=1.5, beta=0.01, d_cutoff=1.0, conf_threshold=0.5, max_prediction=0.15):
+        self.min_cutoff = min_cutoff          # smoothing (Hz) when still, lower = smoother
+        self.beta = beta                      # how quickly smoothing drops as speed increases
+        self.d_cutoff = d_cutoff              # smoothing (Hz) of the velocity estimate
+        self.conf_threshold = conf_threshold  # keypoints below this confidence are not updated
+        self.max_prediction = max_prediction  # never predict further ahead than this (seconds)
+        self.reset()
+
+
+    def reset(self):
+        self.x = None       # filtered positions
+        self.dx = None      # filtered velocities (pixels per second)
+        self.seen = None    # which keypoints have ever been detected
+        self.t = None       # time of the last update
+
+
+    # how much of the new value to mix in for a low pass filter with this cutoff
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+
+    # add a new detection of the person taken at time t (seconds)
+    def update(self, xy, conf, t):
+        xy = np.asarray(xy, dtype=np.float32)
+        detected = np.asarray(conf) >= self.conf_threshold
+
+        if self.x is None:
+            self.x = xy.copy()
+            self.dx = np.zeros_like(self.x)
+            self.seen = detected.copy()
+            self.t = t
+            return
+
+        # keypoints seen for the first time start exactly where they were detected
+        new = detected & ~self.seen
+        self.x[new] = xy[new]
+        self.dx[new] = 0.0
+        self.seen |= detected
+
+        dt = t - self.t
+        self.t = t
+        if dt <= 0:
+            return
+        update = detected & ~new
+
+        # smooth the velocity, then use the speed to decide how much to smooth the position
+        raw_dx = (xy - self.x) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx = a_d * raw_dx + (1.0 - a_d) * self.dx
+
+        speed = np.hypot(dx[:, 0], dx[:, 1])
+        cutoff = self.min_cutoff + self.beta * speed
+        tau = 1.0 / (2.0 * np.pi * cutoff)
+        a = (1.0 / (1.0 + tau / dt))[:, None]
+        x = a * xy + (1.0 - a) * self.x
+
+        self.x[update] = x[update]
+        self.dx[update] = dx[update]
+
+        # keypoints that dropped out stop drifting
+        self.dx[~detected] = 0.0
+
+
+    # keypoint positions predicted for time t (seconds)
+    def predict(self, t):
+        if self.x is None:
+            return None
+        ahead = min(max(t - self.t, 0.0), self.max_prediction)
+        return self.x + self.dx * ahead
@@ -0,0 +1,43 @@
+import numpy as np
+
+# Keypoints come back from the model in the coordinates of whatever image the model was given,
+# which is usually not the size (or side) of the image drawn on screen.
+# This is a small affine transform (scale + offset per axis, no rotation) that maps
+# those keypoints into display space. Steps are chained in the order they happen, e.g.
+#
+#   KeypointTransform().then_scale(1 / model_scale).then_scale(user_scale).then_mirror(disp_w)
+#
+# and the whole thing is applied to all keypoints at once with apply().
+
+class KeypointTransform:
+    def __init__(self, sx=1.0, sy=1.0, tx=0.0, ty=0.0):
+        # x' = sx * x + tx, y' = sy * y + ty
+        self.sx = sx
+        self.sy = sy
+        self.tx = tx
+        self.ty = ty
+
+
+    # scale points (sy defaults to the same as sx)
+    def then_scale(self, sx, sy=None):
+        if sy is None:
+            sy = sx
+        return KeypointTransform(self.sx * sx, self.sy * sy, self.tx * sx, self.ty * sy)
+
+
+    # move points
+    def then_offset(self, dx, dy=0.0):
+        return KeypointTransform(self.sx, self.sy, self.tx + dx, self.ty + dy)
+
+
+    # flip points horizontally inside an image that is width wide
+    def then_mirror(self, width):
+        return KeypointTransform(-self.sx, self.sy, width - self.tx, self.ty)
+
+
+    # transform an array of points (any shape ending in 2), returns a new float32 array
+    def apply(self, xy):
+        out = np.empty(xy.shape, dtype=np.float32)
+        out[..., 0] = xy[..., 0] * self.sx + self.tx
+        out[..., 1] = xy[..., 1] * self.sy + self.ty
+        return out
@@ -1,9 +1,13 @@
-from ultralytics import YOLO
-from config import YOLO_MODEL_PATH
 import pygame
+import time
+from config import DIRTY_RECT_RENDERING, LATENCY_OVERLAY, TARGET_FPS
+from frame_trace import stamp, STEPS
+from startup_timer import startup_timer
 from game.cam_configuration import Configuration
-from game.draw_character import CharacterDraw
+from game.draw_character import CharacterDraw, load_sprites
 from game.meteor_game import MeteorGame
+from game.rate_meter import RateMeter
+from game.text_cache import text_cache
 
 # This is the main class that controls the motion capture game.
 # From here, the main game loop calls the camera configuration,
@@ -11,50 +15,58 @@ from game.meteor_game import MeteorGame
 # and additional game functionality.
 
 class myGame:    
-    def __init__(self):
+    def __init__(self, pipeline):
         self.win_w = 1920
         self.win_h = 1080
         self.mirror = True
         self.spawn_timer = 0
-        self.model = YOLO(YOLO_MODEL_PATH)
+        # the pipeline supplies camera frames and poses (see pipeline.py)
+        self.pipeline = pipeline
         pygame.init()
         self.screen = pygame.display.set_mode((self.win_w, self.win_h), pygame.RESIZABLE)
         pygame.display.set_caption("Motion Capture Dinosuar Game")
+        startup_timer.mark("window open")
         self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont(None, 36)
+        self.render_rate = RateMeter()
+        self.last_stats_update = 0
 
-        # preload all character sprites
-        # this dicionary can easily be changed to any sprites wanted
-        # without hindering the character drawing process
+        # latency of every pose from the phone to the screen (see frame_trace.py)
+        self.latency_stats = pipeline.latency_stats
+        self.latency_overlay = LATENCY_OVERLAY
+        self.latency_lines = []
+
+        # told how long every frame takes to draw, slows pose detection down if frames take too long
+        # (see game/inference_governor.py)
+        self.governor = pipeline.governor
+
+        # preload the background and all character sprites (see SPRITE_PATHS in draw_character.py)
         self.background_image = pygame.image.load("sprites/background.png").convert_alpha()
-        sprite_paths = {
-            "head": "sprites/head.png",
-            "left_forearm": "sprites/arm.png",
-            "right_forearm": "sprites/arm.png",
-            "left_bicep": "sprites/bicep.png",
-            "right_bicep": "sprites/bicep.png",
-            "torso": "sprites/torso.png",
-            "left_thigh": "sprites/thigh.png",
-            "right_thigh": "sprites/thigh.png",
-            "left_shin": "sprites/shin.png",
-            "right_shin": "sprites/shin.png",
-        }
-        self.sprites = {}
-        for name, path in sprite_paths.items():
-            sprite = pygame.image.load(path).convert_alpha()
-            self.sprites[name] = sprite
+        self.sprites = load_sprites()
+
+        # dirty rectangle rendering: instead of redrawing and flipping the whole 1080p screen every frame,
+        # only the parts drawn on last frame are restored from a pre-made background,
+        # and only the parts that changed are sent to the display
+        self.dirty_rendering = DIRTY_RECT_RENDERING
+        self.static_background = None
+        self.prev_rects = []
+        self.full_redraw = True
+        self.build_static_background()
 
 
         # configure camera
-        self.displayConf = Configuration(self.screen, initial_scale=1.0, initial_offx=0, initial_offy=0)
+        self.displayConf = Configuration(self.screen, self.pipeline.frame_source, initial_scale=1.0, initial_offx=0, initial_offy=0)
         self.user_scale, self.user_offx, self.user_offy, self.crop_left, self.crop_right = self.displayConf.configuration()
                 
+        # start running pose detection in the background on the newest (cropped) camera frames
+        self.pose_source = self.pipeline.start_pose_source(self.user_scale, self.mirror, self.crop_left, self.crop_right)
+
         # configure chracter drawing and motion capture (uses variables returned from camera configuration to adjust image)
-        self.draw_character = CharacterDraw(self.screen, self.model, self.user_offx, self.user_offy, self.user_scale, self.crop_left, self.crop_right, self.mirror, self.sprites)
+        self.draw_character = CharacterDraw(self.screen, self.pose_source, self.user_offx, self.user_offy, self.user_scale, self.crop_left, self.crop_right, self.mirror, self.sprites)
         
         # configure the game to be played
         # this can easily be swapped out for any other game without effecting the motion capture or character
         self.game = MeteorGame()
+        startup_timer.mark("game started")
         
     
     def run_pygame_loop(self):
@@ -63,16 +75,24 @@ class myGame:
         waiting_for_input = True
         while runapp:
             while running:
+                frame_start = time.perf_counter()
                 for event in pygame.event.get():
                     if event.type == pygame.QUIT:
                         running = False
+                    if event.type == pygame.VIDEORESIZE:
+                        self.build_static_background()
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_l:
+                        self.latency_overlay = not self.latency_overlay
 
-                self.screen.fill((0, 255, 0))
-                self.screen.blit(self.background_image, (0, 0))
+                # clear the screen back to the background
+                # (either all of it, or only the parts that were drawn on last frame)
+                self.restore_background()
                 
-                # draw character and get hitbox wanted for this game
+                # draw characters and get the hitboxes wanted for this game (one per player)
                 self.draw_character.draw_character()
-                hitbox = self.draw_character.get_head_rect()
+                hitbox = self.draw_character.get_head_rects()
+                if self.draw_character.pose_seq:
+                    startup_timer.mark("first pose")
                         
                 # this particular game can spawn meteors,
                 # so setup a time to spawn them
@@ -84,8 +104,18 @@ class myGame:
                 # this particular game requires updating and drawing meteors every frame
                 running = self.game.update_and_draw_meteors(self.screen, hitbox)
 
-                pygame.display.flip()
-                self.clock.tick(60)
+                drawn_rects = self.draw_character.drawn_rects + self.game.drawn_rects
+                if self.latency_overlay:
+                    drawn_rects += self.draw_latency_overlay(self.screen)
+
+                self.update_display(drawn_rects)
+                self.record_latency()
+
+                # how long the frame took to make, not counting the wait for the next one
+                self.governor.render_tick(time.perf_counter() - frame_start)
+                self.clock.tick(TARGET_FPS)
+                self.render_rate.tick()
+                self.update_stats()
             
             waiting_for_input = True
             while waiting_for_input:
@@ -104,20 +134,108 @@ class myGame:
                             running = True
                             waiting_for_input = False
                             self.game = MeteorGame()
+                            self.full_redraw = True
 
                 self.screen.fill((0, 0, 0))
                 self.draw_exit_restart(self.screen)
                 pygame.display.flip()
+
+                # nothing moves on this screen, so there's no need to redraw it as fast as possible
+                self.clock.tick(30)
         pygame.quit()
         
         
     def draw_exit_restart(self, screen):
-        exit_text = self.font.render("Press Q to Exit", True, (255, 255, 255))
-        restart_text = self.font.render("Press R to Restart", True, (255, 255, 255))
+        exit_text = text_cache.render("Press Q to Exit", 36, (255, 255, 255))
+        restart_text = text_cache.render("Press R to Restart", 36, (255, 255, 255))
 
         screen.blit(exit_text, (40, 40))
         screen.blit(restart_text, (40, 80))
-        
 
 
+    # show render and inference speeds in the window title
+    # (updated once a second, since they are measured independently)
+    def update_stats(self):
+        now = pygame.time.get_ticks()
+        if now - self.last_stats_update < 1000:
+            return
+        self.last_stats_update = now
+        stats = self.pose_source.stats()
+        caption = (
+            f"Motion Capture Dinosuar Game - render {self.render_rate.rate():.0f} fps"
+            f" | inference {stats['inference_fps']:.1f} fps ({stats['inference_ms']:.0f} ms)"
+        )
+        # how much of the time pose detection only searched around the players (see game/pose_region.py)
+        if "roi_share" in stats:
+            caption += f" | roi {100 * stats['roi_share']:.0f}%"
+
+        # how often the governor lets pose detection run
+        governor = self.governor.stats()
+        if governor["inference_cap_fps"] is not None:
+            caption += f" | pose capped at {governor['inference_cap_fps']:.0f} fps ({governor['state']})"
+        pygame.display.set_caption(caption)
+        if self.latency_overlay:
+            self.update_latency_lines()
+
+
+    # once a pose has been drawn and sent to the display, its trace is finished
+    def record_latency(self):
+        trace = self.draw_character.drawn_trace
+        if trace is not None:
+            stamp(trace, "flipped")
+            self.latency_stats.record(trace)
+
+
+    # text for the latency overlay, one line per step (only worked out once a second, in update_stats)
+    def update_latency_lines(self):
+        summary = self.latency_stats.summary()
+        self.latency_lines = [f"latency ms (p50 / p95 / p99) over {min(summary['samples'], self.latency_stats.window)} frames"]
+        for step in STEPS:
+            p = summary["steps"].get(step)
+            if p is not None:
+                self.latency_lines.append(f"{step:<20} {p['p50']:7.1f} {p['p95']:7.1f} {p['p99']:7.1f}")
+
+        governor = self.governor.stats()
+        cap = "no limit" if governor["inference_cap_fps"] is None else f"every {governor['interval_ms']:.0f} ms"
+        self.latency_lines.append(f"render {governor['render_ms']:.1f} ms of {1000.0 / governor['target_fps']:.1f} ms budget")
+        self.latency_lines.append(f"pose detection {cap} ({governor['state']})")
+
+
+    # draw the latency overlay in the top right corner, returns the rects drawn
+    def draw_latency_overlay(self, screen):
+        rects = []
+        y = 10
+        for line in self.latency_lines:
+            txt = text_cache.render(line, 24, (255, 255, 255), (0, 0, 0))
+            rects.append(screen.blit(txt, (screen.get_width() - txt.get_width() - 10, y)))
+            y += txt.get_height()
+        return rects
+
+
+    # the background never changes during the game, so combine the fill colour and background image once
+    def build_static_background(self):
+        self.static_background = pygame.Surface(self.screen.get_size()).convert()
+        self.static_background.fill((0, 255, 0))
+        self.static_background.blit(self.background_image, (0, 0))
+        self.full_redraw = True
+
+
+    # clear what was drawn last frame
+    def restore_background(self):
+        if not self.dirty_rendering or self.full_redraw:
+            self.screen.blit(self.static_background, (0, 0))
+            return
+
+        for rect in self.prev_rects:
+            self.screen.blit(self.static_background, rect, rect)
+
 
+    # send this frame to the display
+    # in dirty rectangle mode only the areas drawn this frame and last frame need updating
+    def update_display(self, drawn_rects):
+        if not self.dirty_rendering or self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.prev_rects + drawn_rects)
+        self.prev_rects = drawn_rects
@@ -1,16 +1,27 @@
 import pygame
 import random
 import sys
+import numpy as np
+from game.text_cache import text_cache
+from game.entity_store import MeteorStore, GOOD, BAD
 
 
 # This is a quick and simple meteor avoiding game that I made to show off the motion capture capabilities
 # You are a dinosaur that collects eggs to get points, but must avoid meteors in the process
 
 class MeteorGame:
-    def __init__(self):
-        
-        self.meteors = []
+    def __init__(self, seed=None):
+
+        # meteors are spawned from their own random generator,
+        # so giving a seed (with a replayed pose trace) makes a whole game repeatable
+        self.random = random.Random(seed)
+
+        # every falling meteor/egg, stored as numpy arrays (see entity_store.py)
+        self.meteors = MeteorStore()
         self.score = 0
+
+        # everything drawn this frame (used to only update the changed parts of the screen)
+        self.drawn_rects = []
         
         # preload sprites
         self.m1sprite = pygame.image.load("sprites/meteor1.png").convert_alpha()
@@ -19,101 +30,93 @@ class MeteorGame:
     
         self.meteor_scale_range = (0.2, .5)
         self.flicker_interval = 120
+
+        # pre-scale every animation frame for a handful of sizes when the game loads,
+        # so spawning and animating meteors never has to scale sprites while playing
+        # (meteor sizes are picked from these buckets instead of any size in the range)
+        self.scale_buckets = 8
+        low, high = self.meteor_scale_range
+        self.bucket_scales = [low + (high - low) * i / (self.scale_buckets - 1) for i in range(self.scale_buckets)]
+        self.egg_frames = [[pygame.transform.scale_by(self.egg, scale)] for scale in self.bucket_scales]
+        self.meteor_frames = [
+            [pygame.transform.scale_by(self.m1sprite, scale), pygame.transform.scale_by(self.m2sprite, scale)]
+            for scale in self.bucket_scales
+        ]
+
+        # animation frames looked up by [meteor type][size bucket][frame]
+        self.frame_table = {GOOD: self.egg_frames, BAD: self.meteor_frames}
+        self.frames_per_type = [len(self.egg_frames[0]), len(self.meteor_frames[0])]
         
 
 
     # spawn a meteor with slight randomization based on parameters
     def spawn_meteor(self, screen_width):
-        x = random.randint(0, screen_width - 60)
+        x = self.random.randint(0, screen_width - 60)
         y = -150
-        speed = random.randint(3, 7)
-        scale = random.uniform(*self.meteor_scale_range)
+        speed = self.random.randint(3, 7)
+        bucket = self.random.randrange(self.scale_buckets)
         
         # "good" meteors are eggs and "bad" meteors are the meteors to avoid
-        meteor_type = random.choice(["good", "bad"])
-
-        if meteor_type == "good":
-            base_sprite = self.egg
-            alt_sprite = None
-        else:
-            # alt_sprite is used for animation of meteors
-            base_sprite = self.m1sprite
-            alt_sprite = self.m2sprite
+        meteor_type = self.random.choice([GOOD, BAD])
 
-        sprite = pygame.transform.scale_by(base_sprite, scale)
+        # the sprites are pre-scaled for this size (eggs only have one animation frame)
+        radius = self.frame_table[meteor_type][bucket][0].get_width() // 2
 
         # save meteor and its attributes
-        self.meteors.append({
-            "x": x,
-            "y": y,
-            "speed": speed,
-            "type": meteor_type,
-            "sprite": sprite,
-            "base_sprite": base_sprite,
-            "alt_sprite": alt_sprite,
-            "scale": scale,
-            "use_alt": False,
-            "last_flicker": pygame.time.get_ticks(),
-            "radius": sprite.get_width() // 2
-        })
-
-
-    def rect_circle_collision(self, rect, cx, cy, radius):
-  
-        closest_x = max(rect.left, min(cx, rect.right))
-        closest_y = max(rect.top, min(cy, rect.bottom))
-        dx = cx - closest_x
-        dy = cy - closest_y
-        return (dx*dx + dy*dy) < (radius*radius)
+        self.meteors.add(x, y, speed, radius, meteor_type, bucket, pygame.time.get_ticks())
 
 
     # update positions and check and handle collisions with player
     def update_and_draw_meteors(self, screen, player_rect):
 
         global score
-        score_font = pygame.font.SysFont(None, 72)
-
-        for meteor in self.meteors[:]:
-            meteor["y"] += meteor["speed"]
-
-            # flicker between meteor sprites to create animation
-            if meteor["alt_sprite"]:
-                now = pygame.time.get_ticks()
-                if now - meteor["last_flicker"] > self.flicker_interval:
-                    meteor["use_alt"] = not meteor["use_alt"]
-                    sprite_source = meteor["alt_sprite"] if meteor["use_alt"] else meteor["base_sprite"]
-                    meteor["sprite"] = pygame.transform.scale_by(sprite_source, meteor["scale"])
-                    meteor["last_flicker"] = now
-
-            screen.blit(meteor["sprite"], (meteor["x"], meteor["y"]))
-
-            # detect collisions with the player
-            if player_rect:
-                cx = meteor["x"] + meteor["radius"]
-                cy = meteor["y"] + meteor["radius"]
-
-                # if there is a collision, good collisions add a point and bad collisions end the game
-                if self.rect_circle_collision(player_rect, cx, cy, meteor["radius"]):
-                    if meteor["type"] == "good":
-                        self.score += 1
-                        self.meteors.remove(meteor)
-                    else:
-                        txt = score_font.render(f"Final Score: {self.score}", True, (255, 255, 255))
-                        screen.blit(txt, (screen.get_width() // 2 - 100, screen.get_height() // 2))
-                        pygame.display.flip()
-                        pygame.time.delay(2000)
-                        return False
-            
+        self.drawn_rects = []
+        meteors = self.meteors
+
+        # move and animate every meteor at once
+        meteors.move()
+        meteors.animate(pygame.time.get_ticks(), self.flicker_interval, self.frames_per_type)
+
+        # draw all meteors in one batch
+        if len(meteors):
+            table = self.frame_table
+            sprites = [
+                table[t][b][f]
+                for t, b, f in zip(meteors.type.tolist(), meteors.bucket.tolist(), meteors.frame.tolist())
+            ]
+            positions = zip(meteors.x.astype(int).tolist(), meteors.y.astype(int).tolist())
+            self.drawn_rects.extend(screen.blits(list(zip(sprites, positions))))
+
+        # detect collisions with the players
+        # (player_rect can be a single hitbox or a list of them, one per player)
+        hitboxes = player_rect if isinstance(player_rect, list) else [player_rect]
+        hitboxes = [rect for rect in hitboxes if rect]
+        if hitboxes and len(meteors):
+            hits = meteors.collide_rect(hitboxes[0])
+            for rect in hitboxes[1:]:
+                hits |= meteors.collide_rect(rect)
+
+            # if there is a collision, good collisions add a point and bad collisions end the game
+            if hits.any():
+                bad_hits = np.flatnonzero(hits & (meteors.type == BAD))
+                if len(bad_hits):
+                    # eggs caught before the first bad meteor (in the order they were spawned) still count,
+                    # like they did when meteors were checked one at a time
+                    self.score += int(np.count_nonzero(hits[:bad_hits[0]]))
+                    txt = text_cache.render(f"Final Score: {self.score}", 72, (255, 255, 255))
+                    screen.blit(txt, (screen.get_width() // 2 - 100, screen.get_height() // 2))
+                    pygame.display.flip()
+                    pygame.time.delay(2000)
+                    return False
+
+                self.score += int(np.count_nonzero(hits))
+                meteors.keep(~hits)
 
         # remove meteors if they're no longer on screen
-        new_meteors = []
-        for meteor in self.meteors:
-            if meteor["y"] - meteor["radius"] < screen.get_height():
-                new_meteors.append(meteor)
-
-        self.meteors = new_meteors
+        meteors.cull(screen.get_height())
 
         # Draw current score
-        score_txt = score_font.render(f"Score: {self.score}", True, (0, 0, 0), (255,0,0))
-        screen.blit(score_txt, (10, 10))
+        # (the cache only renders it again when the score changes)
+        score_txt = text_cache.render(f"Score: {self.score}", 72, (0, 0, 0), (255,0,0))
+        self.drawn_rects.append(screen.blit(score_txt, (10, 10)))
         return True
\ No newline at end of file
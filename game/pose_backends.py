@@ -0,0 +1,255 @@
+import math
+import os
+import numpy as np
+import cv2
+from config import MODEL_INPUT_SIZE
+
+# Pose detection backends. The pose worker doesn't care what runs the model,
+# it gives a backend an image and gets plain numpy arrays back.
+#
+# interface:
+#   infer(image)    image is a BGR frame already shrunk so its long side is the model input size
+#                   returns (xy, conf): xy is (people, 17, 2) keypoints in image pixels, conf is (people, 17)
+#                   (empty arrays when nobody was found)
+#                   the image can also be smaller, when only the part of a frame around people is searched
+#                   (see pose_region.py), and backends that can should run faster on it
+#   roi             False if the backend doesn't look at the image, so searching part of it means nothing
+#
+# - UltralyticsBackend: the original YOLO .pt model through ultralytics (needs torch)
+# - OnnxBackend: the same model exported to ONNX, run on the CPU with ONNX Runtime or OpenCV's dnn module.
+#   Loading torch and ultralytics takes seconds and hundreds of MB, and every call goes through a lot of
+#   python, which is a lot of overhead for a nano model on a school laptop.
+#   Export the model once with:  yolo export model=yolo_models/yolo11n-pose.pt format=onnx imgsz=320
+#   (imgsz should match MODEL_INPUT_SIZE in config.py)
+# - StubPoseBackend: no model at all, always finds the same standing people (for tests and benchmarks)
+
+NUM_KEYPOINTS = 17
+
+
+# the backend named in config.py (or the one asked for)
+def create_pose_backend(name=None, input_size=MODEL_INPUT_SIZE):
+    from config import POSE_BACKEND, YOLO_MODEL_PATH, ONNX_MODEL_PATH, ONNX_ENGINE, ONNX_INT8
+
+    name = name or POSE_BACKEND
+    if name == "ultralytics":
+        return UltralyticsBackend(YOLO_MODEL_PATH, input_size)
+    if name == "onnx":
+        return OnnxBackend(ONNX_MODEL_PATH, input_size, engine=ONNX_ENGINE, int8=ONNX_INT8)
+    if name == "stub":
+        return StubPoseBackend()
+    raise ValueError(f"unknown pose backend: {name}")
+
+
+def _empty():
+    return np.zeros((0, NUM_KEYPOINTS, 2), np.float32), np.zeros((0, NUM_KEYPOINTS), np.float32)
+
+
+# YOLO images have to be a multiple of 32 pixels
+def _stride_multiple(size, stride=32):
+    return max(stride, int(math.ceil(size / float(stride))) * stride)
+
+
+
+class UltralyticsBackend:
+    roi = True
+
+    def __init__(self, model_path, input_size=MODEL_INPUT_SIZE):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.input_size = input_size
+
+
+    def infer(self, image):
+        # ultralytics letterboxes to 640 unless told otherwise
+        # (a smaller image, like a region around the players, is run at its own size instead of being scaled up)
+        imgsz = min(self.input_size, _stride_multiple(max(image.shape[:2])))
+        results = self.model(image, imgsz=imgsz, verbose=False)
+        if not results or getattr(results[0], 'keypoints', None) is None:
+            return _empty()
+
+        kpts = results[0].keypoints
+        if kpts.conf is None:
+            return _empty()
+        return kpts.xy.cpu().numpy(), kpts.conf.cpu().numpy()
+
+
+
+# YOLO pose exported to ONNX
+# the model takes a square RGB image (the size it was exported at) scaled to 0-1,
+# and outputs (1, 56, candidates): box centre x, y, width, height, person score, then x, y, visibility for 17 keypoints
+# Candidates overlap a lot, so the best ones are picked with non-maximum suppression (normally done inside ultralytics).
+# A model exported with dynamic=True can take smaller images too (padded to a multiple of 32 instead of the full square),
+# which makes searching a region around the players cheaper. A fixed size model scales the region up to fill its input,
+# so it costs the same as a whole frame but sees the players in more detail.
+class OnnxBackend:
+    roi = True
+
+    def __init__(self, model_path, input_size=MODEL_INPUT_SIZE, engine="auto", int8=False,
+                 score_threshold=0.25, iou_threshold=0.45, max_people=8):
+        self.score_threshold = score_threshold
+        self.iou_threshold = iou_threshold
+        self.max_people = max_people
+        self.session = None
+        self.net = None
+        self.dynamic = False
+
+        if engine == "auto":
+            try:
+                import onnxruntime
+                engine = "onnxruntime"
+            except ImportError:
+                engine = "opencv"
+        self.engine = engine
+
+        if engine == "onnxruntime":
+            import onnxruntime
+            if int8:
+                model_path = quantize_model(model_path)
+            self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+            model_input = self.session.get_inputs()[0]
+            self.input_name = model_input.name
+            size = model_input.shape[-1]
+            self.dynamic = not isinstance(size, int)
+            self.model_size = input_size if self.dynamic else size
+        elif engine == "opencv":
+            if int8:
+                raise ValueError("int8 quantization needs onnxruntime")
+            self.net = cv2.dnn.readNetFromONNX(model_path)
+            self.model_size = input_size
+        else:
+            raise ValueError(f"unknown onnx engine: {engine}")
+
+        # the padded model input is reused between calls
+        self._canvas = np.full((self.model_size, self.model_size, 3), 114, np.uint8)
+
+
+    def infer(self, image):
+        blob, scale = self._prepare(image)
+        if self.session is not None:
+            output = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            self.net.setInput(blob)
+            output = self.net.forward()
+        return self._decode(output, scale)
+
+
+    # put the image in the top left corner of the square model input (padding the rest),
+    # so keypoints only need scaling back, not moving
+    def _prepare(self, image):
+        h, w = image.shape[:2]
+        scale = 1.0
+        if max(h, w) > self.model_size or (max(h, w) < self.model_size and not self.dynamic):
+            scale = self.model_size / float(max(h, w))
+            image = cv2.resize(image, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+            h, w = image.shape[:2]
+
+        canvas = self._canvas
+        if self.dynamic:
+            canvas = canvas[:_stride_multiple(h), :_stride_multiple(w)]
+        canvas[:] = 114
+        canvas[:h, :w] = image
+        blob = cv2.dnn.blobFromImage(canvas, 1.0 / 255.0, swapRB=True)
+        return blob, scale
+
+
+    # turn the raw model output into the people that were found
+    def _decode(self, output, scale):
+        preds = output[0].T
+        scores = preds[:, 4]
+        keep = scores > self.score_threshold
+        if not keep.any():
+            return _empty()
+        preds = preds[keep]
+        scores = scores[keep]
+
+        # overlapping candidates are the same person, keep the best scoring one
+        boxes = np.empty((len(preds), 4), np.float32)
+        boxes[:, :2] = preds[:, :2] - preds[:, 2:4] / 2
+        boxes[:, 2:] = preds[:, 2:4]
+        picked = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), self.score_threshold, self.iou_threshold)
+        picked = np.asarray(picked, dtype=np.int64).reshape(-1)[:self.max_people]
+
+        kpts = preds[picked, 5:].reshape(-1, NUM_KEYPOINTS, 3)
+        xy = (kpts[:, :, :2] / scale).astype(np.float32)
+        conf = kpts[:, :, 2].astype(np.float32)
+        return xy, conf
+
+
+
+# make (or reuse) an int8 copy of an onnx model next to it
+# weights are stored as 8 bit integers, which makes the model about 4x smaller and usually faster on older CPUs
+# (check the speed and accuracy on the machine it will run on)
+def quantize_model(model_path):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    int8_path = os.path.splitext(model_path)[0] + "-int8.onnx"
+    if not os.path.exists(int8_path) or os.path.getmtime(int8_path) < os.path.getmtime(model_path):
+        quantize_dynamic(model_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+
+# always finds the same people (standing, swaying a little from call to call), without any model
+# the same sequence of calls always gives the same keypoints, so runs with it are repeatable
+class StubPoseBackend:
+
+    # people are placed relative to whatever image it's given, so a region around them would just shrink them
+    roi = False
+
+    # standing person, keypoints as fractions of the image size (YOLO order)
+    STANDING = np.array([
+        [.50, .15], [.52, .13], [.48, .13], [.54, .14], [.46, .14],
+        [.58, .25], [.42, .25], [.62, .38], [.38, .38], [.64, .50], [.36, .50],
+        [.56, .55], [.44, .55], [.57, .72], [.43, .72], [.57, .90], [.43, .90],
+    ], dtype=np.float32)
+
+    def __init__(self, people=1, conf=0.9):
+        self.people = people
+        self.conf = conf
+        self.calls = 0
+
+
+    def infer(self, image):
+        h, w = image.shape[:2]
+        t = self.calls / 10.0
+        self.calls += 1
+
+        xy = np.repeat(self.STANDING[None], self.people, axis=0) * [w, h]
+        for person in range(self.people):
+            xy[person, :, 0] += (person - (self.people - 1) / 2) * 0.3 * w + 0.03 * w * math.sin(t + person)
+        conf = np.full((self.people, NUM_KEYPOINTS), self.conf, np.float32)
+        return xy.astype(np.float32), conf
+
+
+
+# finds the bright figure in the image (every channel above threshold) and stands a person in the box around it,
+# without any model. Unlike StubPoseBackend it follows what's in the image, so tests and benchmarks can run
+# the pose worker's cropping, resizing and region tracking (see pose_region.py) on frames with a figure drawn in them
+# (halfway between black and white finds the edges of a white figure on black where the resize blurred them)
+class FigureBackend:
+    roi = True
+
+    def __init__(self, threshold=128, conf=0.9):
+        self.threshold = threshold
+        self.conf = conf
+        # size (h, w) of every image it was given
+        self.sizes = []
+
+
+    def infer(self, image):
+        self.sizes.append(image.shape[:2])
+        ys, xs = np.nonzero(image.min(axis=2) > 180)
+        if not len(xs):
+            return np.zeros((0, NUM_KEYPOINTS, 2), np.float32), np.zeros((0, NUM_KEYPOINTS), np.float32)
+        x0, y0, x1, y1 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+        xy = StubPoseBackend.STANDING * [x1 - x0, y1 - y0] + [x0, y0]
+        return xy[None].astype(np.float32), np.full((1, NUM_KEYPOINTS), self.conf, np.float32)
+
+
+
+# run a backend a couple of times on a blank image, so the first real frame isn't slowed down by
+# one-off work (memory allocation, kernel selection and lazy setup inside torch or onnxruntime)
+def warm_up(backend, input_size=MODEL_INPUT_SIZE, runs=2):
+    image = np.full((input_size * 9 // 16, input_size, 3), 114, np.uint8)
+    for _ in range(runs):
+        backend.infer(image)
@@ -0,0 +1,97 @@
+from config import POSE_ROI_MARGIN, POSE_ROI_FULL_EVERY, POSE_ROI_CONF_DROP
+
+# Pose-guided region of interest.
+# Once people have been found, the next frame only needs searching around where they were,
+# so the pose worker runs the model on a crop around the last detections (plus a margin for movement)
+# instead of on the whole frame. The crop is shrunk by the same amount the whole frame would be,
+# so the people are the same size to the model, it just gets a smaller image to look through.
+#
+# The whole frame is still searched:
+# - every full_every frames, so someone walking into the picture is found
+# - when fewer people are found than on the last whole frame (someone left the crop)
+# - when the keypoint confidence drops well below what it was on the last whole frame
+# - when the people cover most of the frame anyway (cropping wouldn't save anything)
+#
+# Regions are in pixels of the (configuration cropped) frame the worker runs on, but the box around the
+# people is kept as fractions of the frame size, since frames can be decoded at a different size from
+# one frame to the next (the phone changes its upload size, or the reduced jpeg decode changes).
+
+# keypoints at least this confident count towards a person's box
+KEYPOINT_CONF = 0.5
+
+# a detection needs this many confident keypoints to count as a person
+MIN_KEYPOINTS = 5
+
+
+class PoseRegion:
+    def __init__(self, margin=POSE_ROI_MARGIN, full_every=POSE_ROI_FULL_EVERY, conf_drop=POSE_ROI_CONF_DROP, max_area=0.6):
+        self.margin = margin
+        self.full_every = full_every
+        self.conf_drop = conf_drop
+        self.max_area = max_area
+
+        # box around everyone found last frame (x0, y0, x1, y1), and how far it moved since the frame before
+        # (as fractions of the frame width and height)
+        self.box = None
+        self.motion = (0.0, 0.0)
+
+        # what the last whole frame pass found, to notice when the crop starts missing things
+        self.full_people = 0
+        self.full_conf = 0.0
+        self.since_full = 0
+
+        # share of recent frames that ran on a crop (for the stats)
+        self.share = 0.0
+
+
+    # where to run the model on the next frame, (x0, y0, x1, y1) or None for the whole frame
+    def next_region(self, w, h):
+        if self.box is None or self.since_full >= self.full_every:
+            return None
+
+        # grow the box by a margin, plus however far the people moved last frame (in the direction they moved)
+        x0, y0, x1, y1 = self.box[0] * w, self.box[1] * h, self.box[2] * w, self.box[3] * h
+        dx, dy = self.motion[0] * w, self.motion[1] * h
+        margin = self.margin * max(x1 - x0, y1 - y0)
+        x0 = int(max(0, x0 - margin + min(dx, 0)))
+        y0 = int(max(0, y0 - margin + min(dy, 0)))
+        x1 = int(min(w, x1 + margin + max(dx, 0)))
+        y1 = int(min(h, y1 + margin + max(dy, 0)))
+
+        if x1 - x0 < 16 or y1 - y0 < 16 or (x1 - x0) * (y1 - y0) > self.max_area * w * h:
+            return None
+        return x0, y0, x1, y1
+
+
+    # update from what the model found on the region it was given (None for the whole frame)
+    # xy is (people, 17, 2) in pixels of the w x h frame
+    def update(self, xy, conf, region, w, h):
+        confident = conf >= KEYPOINT_CONF
+        people = confident.sum(axis=1) >= MIN_KEYPOINTS
+        count = int(people.sum())
+        avg_conf = float(conf[people].mean()) if count else 0.0
+        self.share = 0.9 * self.share + (0.0 if region is None else 0.1)
+
+        if region is None:
+            self.since_full = 0
+            self.full_people = count
+            self.full_conf = avg_conf
+        else:
+            self.since_full += 1
+
+            # the crop missed someone, or can't see them as well: search the whole frame next time
+            if count < self.full_people or avg_conf < self.full_conf - self.conf_drop:
+                self.box = None
+                return
+
+        if not count:
+            self.box = None
+            return
+
+        points = xy[people][confident[people]] / [float(w), float(h)]
+        box = (float(points[:, 0].min()), float(points[:, 1].min()), float(points[:, 0].max()), float(points[:, 1].max()))
+        if self.box is not None:
+            self.motion = ((box[0] + box[2] - self.box[0] - self.box[2]) / 2, (box[1] + box[3] - self.box[1] - self.box[3]) / 2)
+        else:
+            self.motion = (0.0, 0.0)
+        self.box = box
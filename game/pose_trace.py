@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+import numpy as np
+from game.pose_worker import PoseResult
+from game.rate_meter import RateMeter
+
+# Recording the poses YOLO finds and playing them back later without YOLO.
+#
+# This lets the drawing and game code be run (profiled, benchmarked, tested) on machines
+# that don't have ultralytics, the model weights or a camera, and makes collisions reproducible.
+#
+# A pose trace is a short header followed by fixed size records, one per detected person
+# (plus one empty record for frames where nobody was detected, so the timing is kept).
+# Keypoints and confidences are stored as float16 to keep traces small. Keypoints are stored as fractions
+# of the display size, where float16 is precise to about 1/4000 (within half a pixel up to 1920 wide),
+# instead of pixels, where it would be off by up to a pixel past 1024 and two past 2048.
+# Version 1 traces stored pixels and can't be loaded any more.
+
+MAGIC = b"POSETRC2"
+NUM_KEYPOINTS = 17
+TRACE_DTYPE = np.dtype([
+    ("seq", "<u4"),
+    ("timestamp", "<f8"),
+    ("count", "<u2"),           # people detected in this frame (0 for an empty frame)
+    ("disp_w", "<u2"),
+    ("disp_h", "<u2"),
+    ("xy", "<f2", (NUM_KEYPOINTS, 2)),
+    ("conf", "<f2", (NUM_KEYPOINTS,)),
+])
+
+
+# writes pose results to a trace file (use record() as a PoseWorker on_result function)
+# an existing trace at the path is replaced: a second session appended to it would restart the
+# seq numbers and jump the timestamps, which playback can't follow
+class PoseTraceRecorder:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self.frames = 0
+
+
+    def record(self, result):
+        count = result.xy.shape[0]
+        records = np.zeros(max(1, count), dtype=TRACE_DTYPE)
+        records["seq"] = result.seq
+        records["timestamp"] = result.timestamp
+        records["count"] = count
+        records["disp_w"] = result.disp_w
+        records["disp_h"] = result.disp_h
+        if count:
+            records["xy"] = result.xy / [float(result.disp_w), float(result.disp_h)]
+            records["conf"] = result.conf
+        with self._lock:
+            self._file.write(records.tobytes())
+            self.frames += 1
+
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+
+# a pose trace loaded for playback, as one PoseResult per frame
+def load_pose_trace(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a pose trace")
+    count = (os.path.getsize(path) - len(MAGIC)) // TRACE_DTYPE.itemsize
+    if count == 0:
+        return []
+    records = np.memmap(path, dtype=TRACE_DTYPE, mode="r", offset=len(MAGIC), shape=(count,))
+
+    # records of the same frame are next to each other, split them wherever the frame changes
+    starts = np.flatnonzero(np.r_[True, records["seq"][1:] != records["seq"][:-1]])
+    ends = np.r_[starts[1:], len(records)]
+
+    frames = []
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        first = records[start]
+        count = int(first["count"])
+        disp_w, disp_h = int(first["disp_w"]), int(first["disp_h"])
+        xy = np.asarray(records["xy"][start:start + count], dtype=np.float32) * np.float32([disp_w, disp_h])
+        conf = np.asarray(records["conf"][start:start + count], dtype=np.float32)
+        frames.append(PoseResult(i + 1, xy, conf, disp_w, disp_h, float(first["timestamp"])))
+    return frames
+
+
+
+# plays a pose trace back in place of the pose worker (same latest()/stats() interface)
+# - realtime: poses come out with the timing they were recorded with
+# - otherwise: every call to latest() moves on to the next pose, and clock() returns that pose's time,
+#   so a run gives exactly the same results every time no matter how fast the machine is
+class PoseTraceSource:
+    def __init__(self, path, realtime=True, loop=True):
+        self.frames = load_pose_trace(path)
+        self.realtime = realtime
+        self.loop = loop
+        self.inference_rate = RateMeter()
+        self._times = np.array([frame.timestamp for frame in self.frames])
+        if len(self._times):
+            self._times -= self._times[0]
+        self._duration = float(self._times[-1]) if len(self._times) else 0.0
+        self._start = time.perf_counter()
+        self._index = -1
+        self._result = None
+        self._laps = 0
+
+
+    # the time poses are timestamped with (use as the CharacterDraw clock for repeatable runs)
+    def clock(self):
+        if self.realtime:
+            return time.perf_counter()
+        return self._result.timestamp if self._result is not None else self._start
+
+
+    def latest(self):
+        if not self.frames:
+            return None
+
+        if self.realtime:
+            elapsed = time.perf_counter() - self._start
+            laps = 0
+            if self.loop and self._duration > 0:
+                laps, elapsed = divmod(elapsed, self._duration)
+            index = int(np.searchsorted(self._times, elapsed, side="right")) - 1
+            if index < 0:
+                return None
+        else:
+            index = self._index + 1
+            laps = self._laps
+            if index >= len(self.frames):
+                if not self.loop:
+                    return self._result
+                index = 0
+                laps += 1
+
+        if index == self._index and laps == self._laps:
+            return self._result
+
+        # renumber and retime the frame so it looks like a fresh result to the game
+        self._index = index
+        self._laps = laps
+        frame = self.frames[index]
+        seq = int(laps) * len(self.frames) + index + 1
+        timestamp = self._start + laps * self._duration + float(self._times[index])
+        self._result = PoseResult(seq, frame.xy, frame.conf, frame.disp_w, frame.disp_h, timestamp)
+        self.inference_rate.tick(0.0)
+        return self._result
+
+
+    def stats(self):
+        return {
+            "inference_fps": self.inference_rate.rate(),
+            "inference_ms": 0.0,
+        }
+
+
+    def stop(self):
+        pass
@@ -0,0 +1,123 @@
+import numpy as np
+from game.keypoint_filter import OneEuroKeypointFilter
+
+# Keeps track of who is who between pose updates.
+#
+# YOLO doesn't return people in the same order every frame, so matching people by their index
+# made the characters swap between players (which is why originally only person 0 was drawn).
+# Each person gets a track with a permanent id and its own keypoint filter.
+# Every update, new detections are matched to the existing tracks by how far apart
+# their keypoints are (compared to the size of the person) and how different in size the boxes
+# around their keypoints are, with the closest pairs matched first. Without the box term a bigger
+# player standing next to a child looked "closer" (distances are in body sizes), so the child's
+# character could jump to them.
+# Detections that don't match anyone start a new track, and tracks that haven't been
+# seen for a while are retired.
+
+
+class Track:
+    def __init__(self, track_id, conf_threshold):
+        self.id = track_id
+        self.filter = OneEuroKeypointFilter(conf_threshold=conf_threshold)
+        self.conf = None
+        self.last_seen = None
+        self.hits = 0
+
+
+class PoseTracker:
+    def __init__(self, max_tracks=5, max_age=0.5, max_cost=0.6, box_weight=0.5, conf_threshold=0.5):
+        self.max_tracks = max_tracks          # most people tracked at once
+        self.max_age = max_age                # seconds a track is kept after its person disappears
+        self.max_cost = max_cost              # biggest cost (distance in body sizes, plus the box term) still counted as a match
+        self.box_weight = box_weight          # cost of one box being e (~2.7) times the size of the other
+        self.conf_threshold = conf_threshold
+        self.tracks = []
+        self._next_id = 1
+
+
+    # match a new set of detections (people x 17 x 2, people x 17) taken at time t to the tracks
+    def update(self, xy, conf, t):
+        detected = conf >= self.conf_threshold
+
+        # keep only people with enough confident keypoints to be worth tracking
+        people = np.flatnonzero(detected.sum(axis=1) >= 3)
+        xy = xy[people]
+        conf = conf[people]
+        detected = detected[people]
+
+        matches = self._assign(xy, detected, t) if len(self.tracks) and len(people) else []
+
+        matched_tracks = set()
+        matched_people = set()
+        for ti, di in matches:
+            self._update_track(self.tracks[ti], xy[di], conf[di], t)
+            matched_tracks.add(ti)
+            matched_people.add(di)
+
+        # new people start new tracks (the most confident people first, if there isn't room for all)
+        unmatched = [di for di in range(len(people)) if di not in matched_people]
+        unmatched.sort(key=lambda di: -float(conf[di].sum()))
+        for di in unmatched:
+            if len(self.tracks) >= self.max_tracks:
+                break
+            track = Track(self._next_id, self.conf_threshold)
+            self._next_id += 1
+            self._update_track(track, xy[di], conf[di], t)
+            self.tracks.append(track)
+
+        # retire tracks whose person hasn't been seen for a while
+        self.tracks = [track for track in self.tracks if t - track.last_seen <= self.max_age]
+        return self.tracks
+
+
+    def _update_track(self, track, xy, conf, t):
+        track.filter.update(xy, conf, t)
+        track.conf = conf
+        track.last_seen = t
+        track.hits += 1
+
+
+    # pick (track, detection) pairs, cheapest first
+    def _assign(self, xy, detected, t):
+
+        # where each track's keypoints are expected to be right now
+        predicted = np.stack([track.filter.predict(t) for track in self.tracks])
+        seen = np.stack([track.filter.seen for track in self.tracks])
+
+        # average keypoint distance for every track/detection pair, using keypoints both have
+        dist = np.linalg.norm(predicted[:, None] - xy[None], axis=-1)
+        both = seen[:, None] & detected[None]
+        counts = both.sum(axis=-1)
+        mean_dist = np.where(counts > 0, (dist * both).sum(axis=-1) / np.maximum(counts, 1), np.inf)
+
+        # distances are measured in "body sizes", so a match means the same thing near and far from the camera
+        track_size = self._body_size(predicted, seen)
+        person_size = self._body_size(xy, detected)
+        cost = mean_dist / person_size[None]
+
+        # plus how different the boxes around the keypoints are in size (the same person doesn't
+        # change size much between updates, even when they move further than their box is wide)
+        cost = cost + self.box_weight * np.abs(np.log(track_size[:, None] / person_size[None]))
+
+        matches = []
+        used_tracks = set()
+        used_people = set()
+        for flat in np.argsort(cost, axis=None):
+            ti, di = np.unravel_index(flat, cost.shape)
+            if cost[ti, di] > self.max_cost:
+                break
+            if ti in used_tracks or di in used_people:
+                continue
+            matches.append((int(ti), int(di)))
+            used_tracks.add(ti)
+            used_people.add(di)
+        return matches
+
+
+    # size of each person (diagonal of the box around their confident keypoints)
+    @staticmethod
+    def _body_size(xy, detected):
+        big = np.float32(1e9)
+        min_xy = np.where(detected[..., None], xy, big).min(axis=1)
+        max_xy = np.where(detected[..., None], xy, -big).max(axis=1)
+        return np.maximum(np.hypot(*(max_xy - min_xy).T), 1.0)
@@ -0,0 +1,203 @@
+import threading
+import time
+import cv2
+from game.rate_meter import RateMeter
+from game.keypoint_transform import KeypointTransform
+from game.pose_region import PoseRegion
+from jpeg_decode import frame_from
+from frame_trace import trace_from_meta, stamp
+from config import MODEL_INPUT_SIZE, POSE_ROI
+
+# This runs YOLO in a background thread so the pygame loop never has to wait on the model
+# (through a pose backend, see pose_backends.py).
+# The worker always takes the newest frame from the mailbox, runs pose detection
+# at a fixed model input size, and publishes the result.
+# The game just reads whatever the most recent result is,
+# so rendering and inference each run at their own speed
+# (unless the game is falling behind, then the governor spaces inferences out, see inference_governor.py).
+# After people are found, the model only looks at the part of the frame around them (see pose_region.py).
+
+
+# the result of running pose detection on one frame
+# xy and conf hold every detected person, in display coordinates (the frame scaled by user_scale, mirrored if needed)
+# trace holds when the frame reached each stage on its way to the screen (see frame_trace.py)
+# roi is True if the model only looked at the part of the frame around the people found before
+class PoseResult:
+    def __init__(self, seq, xy, conf, disp_w, disp_h, timestamp, inference_ms=0.0, roi=False):
+        self.seq = seq
+        self.xy = xy
+        self.conf = conf
+        self.disp_w = disp_w
+        self.disp_h = disp_h
+        self.timestamp = timestamp
+        self.inference_ms = inference_ms
+        self.roi = roi
+        self.trace = None
+
+
+class PoseWorker:
+    def __init__(self, backend, mailbox, user_scale, mirror, crop_left=0.0, crop_right=1.0, on_result=None, input_size=MODEL_INPUT_SIZE, roi=POSE_ROI, governor=None):
+        self.backend = backend
+        self.mailbox = mailbox
+        self.user_scale = user_scale
+        self.mirror = mirror
+        self.crop_left = crop_left
+        self.crop_right = crop_right
+        self.input_size = input_size
+        self.inference_rate = RateMeter()
+        self._result = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._frame_seq = 0
+        self._last_start = 0.0
+
+        # optional InferenceGovernor that decides how often inference may run
+        self.governor = governor
+
+        # optional function called with every new result (used to publish results to another process)
+        self.on_result = on_result
+
+        # where people were last found, so the next frame can be searched around them
+        # (not for backends that don't look at the image, see pose_backends.py)
+        self.region = PoseRegion() if roi and backend.roi else None
+
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.request_frame_size()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="pose-worker", daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+    # most recent pose result (or None if nothing has been detected yet)
+    def latest(self):
+        with self._lock:
+            return self._result
+
+
+    # inference speed (and how often only part of the frame was searched), used for displaying stats
+    def stats(self):
+        stats = {
+            "inference_fps": self.inference_rate.rate(),
+            "inference_ms": self.inference_rate.avg_ms(),
+        }
+        if self.region is not None:
+            stats["roi_share"] = self.region.share
+        return stats
+
+
+    # run the worker loop in the calling thread until stop() is called
+    def run(self):
+        self.request_frame_size()
+        self._running = True
+        self._run()
+
+
+    def _run(self):
+        while self._running:
+            # leave the game time to render if the governor asks for it (in short sleeps so stop() is noticed)
+            if self.governor is not None:
+                wait = self.governor.delay(self._last_start)
+                if wait > 0:
+                    time.sleep(min(wait, 0.1))
+                    continue
+
+            # wait a short time for a new frame so stop() is noticed quickly
+            latest = self.mailbox.get(self._frame_seq, timeout=0.1)
+            if latest is None:
+                continue
+            self._frame_seq, item, meta = latest
+
+            # decode the frame here (only frames that are actually used get decoded)
+            frame, meta = frame_from(item, meta, self.mailbox.decode_min_side)
+            if frame is None:
+                continue
+
+            trace = trace_from_meta(meta)
+            start = time.perf_counter()
+            stamp(trace, "picked", start)
+            result = self.process_frame(self._frame_seq, frame, meta)
+            done = time.perf_counter()
+            duration = done - start
+            self.inference_rate.tick(duration)
+            self._last_start = start
+            if self.governor is not None:
+                self.governor.inference_tick(duration)
+
+            if result is not None:
+                result.inference_ms = 1000.0 * duration
+                stamp(trace, "inferred", done)
+                result.trace = trace
+                with self._lock:
+                    self._result = result
+                if self.on_result is not None:
+                    self.on_result(result)
+
+
+    # tell the frame producer how big frames need to be, so it can decode them smaller
+    # (the whole frame's long side shrinks to the model input size, so it only has to be at least that big)
+    def request_frame_size(self):
+        self.mailbox.decode_min_side = self.input_size
+
+
+    # crop the frame, shrink it to the model input size, run pose detection on it
+    # and map the keypoints back into display space
+    def process_frame(self, seq, frame, meta=None):
+        h, w = frame.shape[:2]
+
+        # the whole frame's long side becomes the model input size, with or without the configuration crop,
+        # so people are always the same size to the model (the same as for a region, below) and
+        # cropping the sides off only makes the image the model searches smaller
+        model_scale = self.input_size / float(max(w, h))
+
+        # the frame may have been decoded smaller than the camera sent it,
+        # the display size is always based on the size the camera sent
+        src_w = (meta or {}).get("src_w") or w
+        src_h = (meta or {}).get("src_h") or h
+        disp_w = max(1, int(round(src_w * self.user_scale)))
+        disp_h = max(1, int(round(src_h * self.user_scale)))
+
+        # cut off the sides that were cropped out in the configuration before doing anything else,
+        # so they are never resized or searched for people (slicing doesn't copy the frame)
+        left_px = int(self.crop_left * w)
+        right_px = int(self.crop_right * w)
+        if right_px - left_px > 10:
+            frame = frame[:, left_px:right_px]
+        else:
+            left_px = 0
+        crop_h, crop_w = frame.shape[:2]
+
+        # only look around the people found last time if possible (shrunk by the same amount, so
+        # the people are the same size to the model and only the image it searches gets smaller)
+        region = self.region.next_region(crop_w, crop_h) if self.region is not None else None
+        roi_x, roi_y = 0, 0
+        if region is not None:
+            roi_x, roi_y, x1, y1 = region
+            frame = frame[roi_y:y1, roi_x:x1]
+        frame_h, frame_w = frame.shape[:2]
+        model_w = max(1, int(round(frame_w * model_scale)))
+        model_h = max(1, int(round(frame_h * model_scale)))
+        resized = cv2.resize(frame, (model_w, model_h), interpolation=cv2.INTER_AREA)
+
+        # model image -> region of the cropped frame -> full decoded frame -> frame at camera size -> display sized (and mirrored) image
+        to_frame = KeypointTransform().then_scale(frame_w / float(model_w), frame_h / float(model_h)).then_offset(roi_x, roi_y)
+        transform = to_frame.then_offset(left_px).then_scale(src_w / float(w), src_h / float(h))
+        transform = transform.then_scale(self.user_scale)
+        if self.mirror:
+            transform = transform.then_mirror(disp_w)
+
+        # run the image through pose detection (keypoints come back in model image pixels)
+        xy, conf = self.backend.infer(resized)
+        if self.region is not None:
+            self.region.update(to_frame.apply(xy), conf, region, crop_w, crop_h)
+        return PoseResult(seq, transform.apply(xy), conf, disp_w, disp_h, time.perf_counter(), roi=region is not None)
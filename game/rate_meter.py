@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import deque
+
+# Small helper used to measure how often something happens (frames per second)
+# and optionally how long it takes each time.
+# Only the last "window" seconds are kept so the numbers follow changes in load.
+# It's ticked from one thread (the pose worker, flask handlers) and read from others (the game loop),
+# so everything is done under a lock, and readers work out their numbers from a snapshot.
+
+class RateMeter:
+    def __init__(self, window=2.0):
+        self.window = window
+        self.events = deque()
+        self.durations = deque()
+        self.count = 0
+        self._lock = threading.Lock()
+
+
+    # record that the event happened now, with an optional duration in seconds
+    def tick(self, duration=None, now=None):
+        if now is None:
+            now = time.perf_counter()
+        with self._lock:
+            self.events.append(now)
+            self.durations.append(duration)
+            self.count += 1
+
+            # drop events that are older than the window
+            while self.events and now - self.events[0] > self.window:
+                self.events.popleft()
+                self.durations.popleft()
+
+
+    # events per second over the window
+    def rate(self):
+        with self._lock:
+            n = len(self.events)
+            if n < 2:
+                return 0.0
+            span = self.events[-1] - self.events[0]
+        if span <= 0:
+            return 0.0
+        return (n - 1) / span
+
+
+    # average duration in milliseconds over the window
+    def avg_ms(self):
+        with self._lock:
+            durations = list(self.durations)
+        times = [d for d in durations if d is not None]
+        if not times:
+            return 0.0
+        return 1000.0 * sum(times) / len(times)
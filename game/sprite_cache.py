@@ -0,0 +1,107 @@
+import pygame
+from collections import OrderedDict
+
+# Scaling and rotating the limb sprites every frame makes a lot of brand new surfaces,
+# even when the player is standing still. This cache keeps the transformed sprites around
+# so they can be reused. Lengths, sizes and angles are rounded ("quantized") to small steps,
+# so tiny jitters in the pose still land on the same cached sprite.
+#
+# The cache is a least recently used (LRU) cache with a memory cap:
+# when it gets too big, the sprites that haven't been used for the longest are thrown away.
+
+class SpriteTransformCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024, length_step=2, angle_step=2):
+        self.max_bytes = max_bytes
+        self.length_step = length_step
+        self.angle_step = angle_step
+        self._cache = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    # round a length to the nearest step (never below one step)
+    def _quantize_length(self, length):
+        step = self.length_step
+        return max(step, int(round(length / step)) * step)
+
+
+    # round an angle to the nearest step
+    def _quantize_angle(self, angle):
+        step = self.angle_step
+        return (int(round(angle / step)) * step) % 360
+
+
+    # sprite scaled so its width is "length" (keeping its proportions), then rotated by angle degrees
+    # used for limbs, which stretch from one joint to another
+    def scaled_rotated(self, sprite, length, angle):
+        q_len = self._quantize_length(length)
+        q_angle = self._quantize_angle(angle)
+        key = ("rotate", sprite, q_len, q_angle)
+
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        sprite_w, sprite_h = sprite.get_size()
+        new_h = max(1, int(sprite_h * q_len / sprite_w))
+        scaled = pygame.transform.scale(sprite, (q_len, new_h))
+        return self._store(key, pygame.transform.rotate(scaled, q_angle))
+
+
+    # sprite scaled to (width, height), optionally with the smoother (slower) scaling
+    def scaled(self, sprite, width, height, smooth=False):
+        q_w = self._quantize_length(width)
+        q_h = self._quantize_length(height)
+        key = ("scale", sprite, q_w, q_h, smooth)
+
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        if smooth:
+            surf = pygame.transform.smoothscale(sprite, (q_w, q_h))
+        else:
+            surf = pygame.transform.scale(sprite, (q_w, q_h))
+        return self._store(key, surf)
+
+
+    def _lookup(self, key):
+        surf = self._cache.get(key)
+        if surf is None:
+            self.misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return surf
+
+
+    def _store(self, key, surf):
+        self._cache[key] = surf
+        self.bytes += surf.get_pitch() * surf.get_height()
+
+        # throw away the least recently used sprites until the cache fits again
+        while self.bytes > self.max_bytes and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self.bytes -= old.get_pitch() * old.get_height()
+            self.evictions += 1
+        return surf
+
+
+    def clear(self):
+        self._cache.clear()
+        self.bytes = 0
+
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
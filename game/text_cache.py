@@ -0,0 +1,57 @@
+import pygame
+from collections import OrderedDict
+
+# Looking up fonts with SysFont and rendering text are both surprisingly slow,
+# and the game and configuration screen were doing both every single frame.
+# This cache is shared by the whole program:
+# - fonts are only looked up once per (name, size)
+# - rendered text is reused until the text (or its colours) actually changes
+# The least recently used text surfaces are thrown away once there are too many.
+
+class TextCache:
+    def __init__(self, max_surfaces=256):
+        self.max_surfaces = max_surfaces
+        self._fonts = {}
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    # get a font, only creating it the first time it's asked for
+    def font(self, size, name=None):
+        key = (name, size)
+        font = self._fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(name, size)
+            self._fonts[key] = font
+        return font
+
+
+    # get the rendered text, only rendering it if it hasn't been rendered recently
+    def render(self, text, size, color, background=None, name=None):
+        key = (name, size, text, color, background)
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        surf = self.font(size, name).render(text, True, color, background)
+        self._surfaces[key] = surf
+        if len(self._surfaces) > self.max_surfaces:
+            self._surfaces.popitem(last=False)
+        return surf
+
+
+    def stats(self):
+        return {
+            "fonts": len(self._fonts),
+            "surfaces": len(self._surfaces),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# the one cache used everywhere
+text_cache = TextCache()
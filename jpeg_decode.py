@@ -0,0 +1,124 @@
+import struct
+import threading
+import time
+import numpy as np
+import cv2
+
+# Decodes jpegs from the phone straight to a smaller size when the full size isn't needed.
+#
+# A jpeg can be decoded at 1/2, 1/4 or 1/8 of its size for much less work than a full decode
+# (opencv's IMREAD_REDUCED_COLOR_2/4/8 skip the fine detail during decoding instead of throwing it
+# away with a resize afterwards). The reduction is picked from the jpeg's size, read from its header,
+# so the decoded frame is as small as possible while still at least min_side pixels on its long side.
+
+REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# start of frame markers hold the image size (C4, C8 and CC are other kinds of segments)
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+# width and height of a jpeg, read from its header without decoding (None if it can't be found)
+def jpeg_size(data):
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+
+        # padding bytes and markers without a length
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        if marker in _SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack_from(">HH", data, pos + 5)
+            return width, height
+        pos += 2 + length
+    return None
+
+
+# biggest reduction (1, 2, 4 or 8) that keeps the long side at least min_side pixels
+def reduction_for(width, height, min_side):
+    if not min_side:
+        return 1
+    long_side = max(width, height)
+    for factor in (8, 4, 2):
+        if long_side / factor >= min_side:
+            return factor
+    return 1
+
+
+# decode a jpeg, at a reduced size if min_side allows it
+# returns (frame, (full width, full height)), frame is None if the jpeg couldn't be decoded
+def decode_jpeg(data, min_side=None):
+    # imdecode raises on an empty buffer, and an empty upload is just a bad frame
+    if not len(data):
+        return None, (0, 0)
+
+    np_arr = np.frombuffer(data, np.uint8)
+    size = jpeg_size(data)
+
+    factor = reduction_for(size[0], size[1], min_side) if size else 1
+    try:
+        frame = cv2.imdecode(np_arr, REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    except cv2.error:
+        frame = None
+
+    if size is None:
+        size = (frame.shape[1], frame.shape[0]) if frame is not None else (0, 0)
+    return frame, size
+
+
+# A jpeg that hasn't been decoded yet.
+# Uploads are stored like this and only decoded when the game actually takes the frame
+# (on the game's own thread), so frames that get replaced by a newer upload are never decoded at all.
+class EncodedFrame:
+    def __init__(self, data, decode_meter=None):
+        self.data = data
+        self.decode_meter = decode_meter
+        self._decoded = {}
+        self._lock = threading.Lock()
+
+
+    # decode (or reuse an earlier decode of) the frame, same return value as decode_jpeg
+    def decode(self, min_side=None):
+        with self._lock:
+            cached = self._decoded.get(min_side)
+            if cached is not None:
+                return cached
+
+            start = time.perf_counter()
+            decoded = decode_jpeg(self.data, min_side)
+            if self.decode_meter is not None:
+                self.decode_meter.tick(time.perf_counter() - start)
+            self._decoded[min_side] = decoded
+            return decoded
+
+
+# turn something taken out of a frame mailbox into a decoded frame
+# mailboxes hold either EncodedFrames (decoded here) or frames that were already decoded
+# returns (frame, meta) with the frame's full size (and when it was decoded, see frame_trace.py) in meta,
+# frame is None if it couldn't be decoded
+def frame_from(item, meta=None, min_side=None):
+    if not isinstance(item, EncodedFrame):
+        return item, meta
+
+    frame, (src_w, src_h) = item.decode(min_side)
+    meta = dict(meta or {})
+    meta["src_w"] = src_w
+    meta["src_h"] = src_h
+    meta["decoded"] = time.perf_counter()
+    return frame, meta
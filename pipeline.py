@@ -0,0 +1,291 @@
+import queue
+import threading
+import time
+import multiprocessing as mp
+from config import FLASK_PORT, POSE_BACKEND, RECORD_PATH, REPLAY_PATH, POSE_RECORD_PATH, POSE_REPLAY_PATH
+from startup_timer import startup_timer, StartupTimer
+
+# The pipeline gets camera frames from the phone to the game and turns them into poses.
+# There are two versions with the same interface, so the game doesn't care which one it runs with:
+#
+# - LocalPipeline: flask runs in a thread and YOLO runs in a background thread, all in this process
+# - SharedMemoryPipeline: flask (upload + jpeg decoding) runs in its own process, YOLO runs in another,
+#   and frames/keypoints are passed to the game through shared memory rings (see shm_ring.py).
+#   This lets a multi-core laptop actually use more than one core, since everything
+#   no longer competes for the one python interpreter.
+#
+# Either pipeline can also record the frames it receives (RECORD_PATH), or get its frames
+# from a recording instead of the phone (REPLAY_PATH), see frame_capture.py.
+# Poses can be recorded the same way (POSE_RECORD_PATH), or played back from a pose trace
+# instead of running YOLO at all (POSE_REPLAY_PATH), see game/pose_trace.py.
+# Pose detection runs through the backend picked by POSE_BACKEND (ultralytics, onnx or stub), see game/pose_backends.py.
+# Loading the model (and importing torch for it) takes seconds, so both pipelines start loading it
+# in the background as soon as they start, and warm it up, while the configuration screen is already running.
+# Both also have an inference governor, which slows pose detection down if the game can't render
+# at its target frame rate (see game/inference_governor.py).
+#
+# interface:
+#   start()                                   start receiving frames (and loading the pose model in the background)
+#   frame_source                              mailbox the configuration screen reads frames from
+#   start_pose_source(user_scale, mirror, crop_left, crop_right)
+#                                             start pose detection, returns an object with latest() and stats()
+#   latency_stats                             where the game records frame latencies (served at /metrics, see frame_trace.py)
+#   governor                                  where the game records render times, decides how often pose detection runs
+#   stop()                                    shut everything down
+
+
+class LocalPipeline:
+    def __init__(self, pose_backend=POSE_BACKEND, port=FLASK_PORT, record_path=RECORD_PATH, replay_path=REPLAY_PATH,
+                 pose_record_path=POSE_RECORD_PATH, pose_replay_path=POSE_REPLAY_PATH):
+        import flask_app
+        from game.inference_governor import InferenceGovernor
+        self.flask_app = flask_app
+        self.pose_backend = pose_backend
+        self.port = port
+        self.record_path = record_path
+        self.replay_path = replay_path
+        self.pose_record_path = pose_record_path
+        self.pose_replay_path = pose_replay_path
+        self.frame_source = flask_app.frame_mailbox
+        self.latency_stats = flask_app.latency_stats
+        self.governor = InferenceGovernor()
+        flask_app.governor = self.governor
+        self.backend = None
+        self.backend_error = None
+        self.backend_loader = None
+        self.pose_worker = None
+        self.pose_recorder = None
+        self.replay = None
+
+
+    def start(self):
+        from frame_capture import FrameRecorder, ReplaySource
+
+        if self.replay_path:
+            self.replay = ReplaySource(self.replay_path, self.frame_source, loop=True)
+            self.replay.start()
+        else:
+            if self.record_path:
+                self.flask_app.frame_recorder = FrameRecorder(self.record_path)
+            app = self.flask_app.app
+            threading.Thread(target=lambda: app.run(host="0.0.0.0", port=self.port, threaded=True), daemon=True).start()
+
+        startup_timer.mark("receiving frames")
+
+        # the model isn't needed at all when poses come from a trace
+        if not self.pose_replay_path:
+            self.backend_loader = threading.Thread(target=self._load_backend, name="pose-backend-loader", daemon=True)
+            self.backend_loader.start()
+
+
+    def _load_backend(self):
+        try:
+            self.backend = load_pose_backend(self.pose_backend, startup_timer)
+        except Exception as e:
+            self.backend_error = e
+            raise
+
+
+    def start_pose_source(self, user_scale, mirror, crop_left=0.0, crop_right=1.0):
+        from game.pose_worker import PoseWorker
+        from game.pose_trace import PoseTraceRecorder, PoseTraceSource
+
+        if self.pose_replay_path:
+            self.pose_worker = PoseTraceSource(self.pose_replay_path)
+            return self.pose_worker
+
+        # normally the model finished loading during the configuration screen, otherwise wait for it
+        self.backend_loader.join()
+        if self.backend is None:
+            raise RuntimeError("the pose model could not be loaded") from self.backend_error
+
+        if self.pose_record_path:
+            self.pose_recorder = PoseTraceRecorder(self.pose_record_path)
+        on_result = self.pose_recorder.record if self.pose_recorder is not None else None
+        self.pose_worker = PoseWorker(self.backend, self.frame_source, user_scale, mirror, crop_left, crop_right,
+                                      on_result=on_result, governor=self.governor)
+        self.pose_worker.start()
+        return self.pose_worker
+
+
+    def stop(self):
+        if self.pose_worker is not None:
+            self.pose_worker.stop()
+        if self.pose_recorder is not None:
+            self.pose_recorder.close()
+        if self.replay is not None:
+            self.replay.stop()
+        if self.flask_app.frame_recorder is not None:
+            self.flask_app.frame_recorder.close()
+
+
+
+class SharedMemoryPipeline:
+
+    # reader ids for the frame ring
+    CONFIG_READER = 0
+    INFERENCE_READER = 1
+
+    def __init__(self, pose_backend=POSE_BACKEND, port=FLASK_PORT, record_path=RECORD_PATH, replay_path=REPLAY_PATH,
+                 pose_record_path=POSE_RECORD_PATH, pose_replay_path=POSE_REPLAY_PATH):
+        from shm_ring import SharedFrameRing, SharedPoseRing
+        from frame_trace import LatencyStats
+        from game.inference_governor import InferenceGovernor
+
+        self.pose_backend = pose_backend
+        self.port = port
+        self.record_path = record_path
+        self.replay_path = replay_path
+        self.pose_record_path = pose_record_path
+        self.pose_replay_path = pose_replay_path
+        self.pose_trace = None
+
+        # this process creates (and owns) the shared memory, the other processes attach to it by name
+        self.frame_ring = SharedFrameRing(reader=self.CONFIG_READER)
+        self.pose_ring = SharedPoseRing(reader=0)
+        self.frame_source = self.frame_ring
+
+        # the game records latencies here and the ingest process serves them at /metrics
+        self.latency_stats = LatencyStats(shared=True)
+
+        # the game records render times here, the inference process follows its decisions
+        self.governor = InferenceGovernor(shared=True)
+        self.stop_event = mp.Event()
+        self.processes = []
+
+        # the inference process starts (and loads the model) straight away,
+        # and is sent the configuration settings through here once they are chosen
+        self.pose_settings = mp.Queue()
+
+
+    def start(self):
+        ingest = mp.Process(
+            target=run_ingest_process,
+            args=(self.frame_ring.name, self.latency_stats.name, self.governor.name, self.port, self.record_path, self.replay_path),
+            name="pose-capture-ingest",
+            daemon=True,
+        )
+        ingest.start()
+        self.processes.append(ingest)
+        startup_timer.mark("receiving frames")
+
+        # a pose trace is cheap to play back, so it doesn't need a process of its own
+        if self.pose_replay_path:
+            return
+
+        inference = mp.Process(
+            target=run_inference_process,
+            args=(self.frame_ring.name, self.pose_ring.name, self.governor.name, self.pose_backend, self.pose_settings,
+                  self.pose_record_path, self.stop_event, startup_timer.origin),
+            name="pose-capture-inference",
+            daemon=True,
+        )
+        inference.start()
+        self.processes.append(inference)
+
+
+    def start_pose_source(self, user_scale, mirror, crop_left=0.0, crop_right=1.0):
+        if self.pose_replay_path:
+            from game.pose_trace import PoseTraceSource
+            self.pose_trace = PoseTraceSource(self.pose_replay_path)
+            return self.pose_trace
+
+        self.pose_settings.put((user_scale, mirror, crop_left, crop_right))
+        return self.pose_ring
+
+
+    def stop(self):
+        self.stop_event.set()
+        for proc in self.processes:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+        self.processes = []
+        self.frame_ring.close()
+        self.pose_ring.close()
+        self.latency_stats.close()
+        self.governor.close()
+
+
+
+# entry point of the ingest process: run flask, decoding uploads straight into the frame ring
+# (decoding here instead of in the game is what this process is for, so uploads aren't decoded lazily)
+def run_ingest_process(frame_ring_name, latency_stats_name, governor_name, port, record_path, replay_path):
+    import flask_app
+    from shm_ring import SharedFrameRing
+    from frame_capture import FrameRecorder, ReplaySource
+    from frame_trace import LatencyStats
+    from game.inference_governor import InferenceGovernor
+
+    frame_ring = SharedFrameRing(name=frame_ring_name)
+    if replay_path:
+        ReplaySource(replay_path, frame_ring, loop=True, decode=True).run()
+        return
+
+    flask_app.frame_mailbox = frame_ring
+    flask_app.latency_stats = LatencyStats(name=latency_stats_name)
+    flask_app.governor = InferenceGovernor(name=governor_name)
+    flask_app.decode_on_upload = True
+    if record_path:
+        flask_app.frame_recorder = FrameRecorder(record_path)
+    flask_app.app.run(host="0.0.0.0", port=port, threaded=True)
+
+
+# load and warm up a pose backend, printing how long it took
+def load_pose_backend(pose_backend, timer):
+    from game.pose_backends import create_pose_backend, warm_up
+
+    started = time.perf_counter()
+    backend = create_pose_backend(pose_backend)
+    timer.mark("pose model loaded", started)
+
+    started = time.perf_counter()
+    warm_up(backend)
+    timer.mark("pose model warmed up", started)
+    return backend
+
+
+# entry point of the inference process: load the model while the game is being configured,
+# then run pose detection on the newest frame and publish poses to the pose ring
+def run_inference_process(frame_ring_name, pose_ring_name, governor_name, pose_backend, pose_settings, pose_record_path, stop_event, startup_origin):
+    from shm_ring import SharedFrameRing, SharedPoseRing
+    from game.pose_worker import PoseWorker
+    from game.pose_trace import PoseTraceRecorder
+    from game.inference_governor import InferenceGovernor
+
+    backend = load_pose_backend(pose_backend, StartupTimer(startup_origin, label="inference process"))
+
+    # wait for the configuration screen to finish (or the game to close before it does)
+    while True:
+        try:
+            user_scale, mirror, crop_left, crop_right = pose_settings.get(timeout=0.1)
+            break
+        except queue.Empty:
+            if stop_event.is_set():
+                return
+
+    frame_ring = SharedFrameRing(name=frame_ring_name, reader=SharedMemoryPipeline.INFERENCE_READER)
+    pose_ring = SharedPoseRing(name=pose_ring_name)
+    governor = InferenceGovernor(name=governor_name)
+
+    # publish every result to the game (and record it too if asked to)
+    recorder = PoseTraceRecorder(pose_record_path) if pose_record_path else None
+    def on_result(result):
+        pose_ring.publish(result)
+        if recorder is not None:
+            recorder.record(result)
+
+    worker = PoseWorker(backend, frame_ring, user_scale, mirror, crop_left, crop_right, on_result=on_result, governor=governor)
+
+    # stop the worker when the game asks this process to stop
+    def watch_stop():
+        stop_event.wait()
+        worker.stop()
+    threading.Thread(target=watch_stop, daemon=True).start()
+
+    worker.run()
+    if recorder is not None:
+        recorder.close()
+    frame_ring.close()
+    pose_ring.close()
+    governor.close()
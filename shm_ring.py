@@ -0,0 +1,324 @@
+import threading
+import time
+import numpy as np
+import cv2
+from multiprocessing import shared_memory
+from game.pose_worker import PoseResult
+from game.rate_meter import RateMeter
+from frame_trace import STAGES
+
+# Shared memory ring buffers used by the multi-process mode (see pipeline.py).
+# Frames and keypoints are written straight into shared memory by one process
+# and read as numpy views by another, so frames are never pickled or copied
+# (pose results are small, so readers copy those out, see SharedPoseRing.latest).
+#
+# Each ring has a small header of int64 counters followed by a number of slots.
+# The writer fills the next slot, then publishes its sequence number.
+# Readers "hold" the slot they were last given, and the writer never reuses a held slot,
+# so a view handed to a reader stays valid until that reader asks for the next one.
+#
+# The readers and writer use the same interface as FrameMailbox (put/get/seq/stats/decode_min_side),
+# so the game and configuration screen don't need to know which one they are reading from.
+
+# header layout (int64 values)
+_SEQ = 0            # sequence number of the newest slot
+_SLOT = 1           # index of the newest slot
+_PUTS = 2
+_DROPPED = 3
+_CONSUMED = 4       # newest sequence number a reader has taken
+_TAKES = 5          # total takes by every reader (so the writer can see how fast frames are used)
+_MIN_SIDE = 6       # decode_min_side asked for by the readers (0 for full size)
+_HOLDS = 7          # one entry per reader: slot index currently held (-1 for none)
+
+
+class SharedRing:
+    def __init__(self, shm, created, slots, max_readers, slot_arrays, reader):
+        self._shm = shm
+        self._created = created
+        self.slots = slots
+        self.max_readers = max_readers
+        self.reader = reader
+        self.name = shm.name
+
+        # carve the header and every slot array out of the one shared memory block
+        offset = 0
+        self._header = np.ndarray((_HOLDS + max_readers,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self._header.nbytes
+        self._slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self._slot_seq.nbytes
+        self._arrays = {}
+        for key, shape, dtype in slot_arrays:
+            arr = np.ndarray((slots,) + tuple(shape), dtype=dtype, buffer=shm.buf, offset=offset)
+            offset += arr.nbytes
+            self._arrays[key] = arr
+
+        if created:
+            self._header[:] = 0
+            self._header[_HOLDS:] = -1
+            self._slot_seq[:] = 0
+
+        # only one thread of the writing process may write at a time (flask serves uploads on many threads)
+        self._write_lock = threading.Lock()
+        self.stale = 0
+
+
+    # bytes needed for a ring with these slot arrays
+    @staticmethod
+    def _size(slots, max_readers, slot_arrays):
+        size = (_HOLDS + max_readers) * 8 + slots * 8
+        for _, shape, dtype in slot_arrays:
+            size += slots * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return size
+
+
+    @classmethod
+    def _open(cls, name, slots, max_readers, slot_arrays, reader):
+        if name is None:
+            size = cls._size(slots, max_readers, slot_arrays)
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            created = True
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            created = False
+        return shm, created
+
+
+    # pick the slot to write next, skipping any slot a reader is holding
+    # the slot is marked invalid before it is written, and the holds are checked again afterwards
+    # in case a reader grabbed it in between (the reader checks the slot is still valid after holding it)
+    def _next_slot(self):
+        slot = int(self._header[_SLOT])
+        for _ in range(2 * self.slots):
+            slot = (slot + 1) % self.slots
+            if slot in self._held_slots():
+                continue
+            old_seq = int(self._slot_seq[slot])
+            self._slot_seq[slot] = -1
+            if slot in self._held_slots():
+                self._slot_seq[slot] = old_seq
+                continue
+            return slot
+        raise RuntimeError("every ring slot is held by a reader")
+
+
+    def _held_slots(self):
+        return set(int(h) for h in self._header[_HOLDS:])
+
+
+    # publish a slot that has just been filled in
+    def _commit(self, slot):
+        seq = int(self._header[_SEQ]) + 1
+        if self._header[_SEQ] > self._header[_CONSUMED]:
+            self._header[_DROPPED] += 1
+        self._slot_seq[slot] = seq
+        self._header[_SLOT] = slot
+        self._header[_PUTS] += 1
+        self._header[_SEQ] = seq
+        return seq
+
+
+    # newest (seq, slot) if it is newer than last_seq, optionally waiting for it
+    def _wait_newer(self, last_seq, timeout):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            seq = int(self._header[_SEQ])
+            if seq > last_seq:
+                slot = int(self._header[_SLOT])
+
+                # the slot could have been reused between reading seq and slot, so check again
+                if int(self._slot_seq[slot]) == seq:
+                    return seq, slot
+                continue
+            if deadline is None or time.monotonic() >= deadline:
+                return None
+            time.sleep(0.001)
+
+
+    # mark the slot as held by this reader so the writer leaves it alone
+    def _hold(self, slot, seq):
+        if self.reader is not None:
+            self._header[_HOLDS + self.reader] = slot
+
+            # the writer may have picked this slot just before it was held,
+            # in which case the caller has to try again
+            if int(self._slot_seq[slot]) != seq:
+                return False
+        self._header[_CONSUMED] = max(int(self._header[_CONSUMED]), seq)
+        self._header[_TAKES] += 1
+        return True
+
+
+    @property
+    def seq(self):
+        return int(self._header[_SEQ])
+
+
+    def stats(self):
+        return {
+            "seq": int(self._header[_SEQ]),
+            "puts": int(self._header[_PUTS]),
+            "takes": int(self._header[_TAKES]),
+            "dropped": int(self._header[_DROPPED]),
+            "stale": self.stale,
+        }
+
+
+    # release this process's handle (the creator also removes the shared memory)
+    def close(self):
+        if self.reader is not None:
+            self._header[_HOLDS + self.reader] = -1
+        self._header = self._slot_seq = None
+        self._arrays = {}
+        self._shm.close()
+        if self._created:
+            self._shm.unlink()
+
+
+
+# ring of camera frames
+# frames can be any size up to max_w x max_h (in either orientation, since phones send portrait frames),
+# the real size is stored with each slot
+class SharedFrameRing(SharedRing):
+
+    # per slot metadata, stored as floats
+    META_FIELDS = ("timestamp", "src_w", "src_h", "received", "decoded")
+
+    def __init__(self, name=None, max_w=1280, max_h=1280, slots=6, max_readers=2, reader=None):
+        slot_arrays = [
+            ("pixels", (max_h, max_w, 3), np.uint8),
+            ("shape", (2,), np.int64),
+            ("meta", (len(self.META_FIELDS),), np.float64),
+        ]
+        shm, created = self._open(name, slots, max_readers, slot_arrays, reader)
+        super().__init__(shm, created, slots, max_readers, slot_arrays, reader)
+        self.max_w = max_w
+        self.max_h = max_h
+
+
+    # same as FrameMailbox.put, frames larger than the ring are shrunk to fit
+    def put(self, frame, meta=None):
+        h, w = frame.shape[:2]
+        if w > self.max_w or h > self.max_h:
+            fit = min(self.max_w / w, self.max_h / h)
+            frame = cv2.resize(frame, (max(1, int(w * fit)), max(1, int(h * fit))), interpolation=cv2.INTER_AREA)
+            h, w = frame.shape[:2]
+
+        with self._write_lock:
+            slot = self._next_slot()
+            self._arrays["pixels"][slot, :h, :w] = frame
+            self._arrays["shape"][slot] = (h, w)
+            meta_row = self._arrays["meta"][slot]
+            for i, key in enumerate(self.META_FIELDS):
+                meta_row[i] = (meta or {}).get(key, time.perf_counter() if key == "timestamp" else 0.0)
+            return self._commit(slot)
+
+
+    # same as FrameMailbox.get, the frame is a view into shared memory
+    def get(self, last_seq=0, timeout=None):
+        while True:
+            newest = self._wait_newer(last_seq, timeout)
+            if newest is None:
+                self.stale += 1
+                return None
+            seq, slot = newest
+            if self._hold(slot, seq):
+                break
+        return seq, self._frame_view(slot), self._meta(slot)
+
+
+    # same as FrameMailbox.decode_min_side, stored in shared memory so the ingest process can see it
+    @property
+    def decode_min_side(self):
+        return int(self._header[_MIN_SIDE]) or None
+
+    @decode_min_side.setter
+    def decode_min_side(self, value):
+        self._header[_MIN_SIDE] = int(value or 0)
+
+
+    def _frame_view(self, slot):
+        h, w = self._arrays["shape"][slot]
+        return self._arrays["pixels"][slot, :h, :w]
+
+
+    def _meta(self, slot):
+        row = self._arrays["meta"][slot]
+        return {key: float(row[i]) for i, key in enumerate(self.META_FIELDS)}
+
+
+
+# ring of pose results (keypoints and confidences for up to max_people people)
+class SharedPoseRing(SharedRing):
+    def __init__(self, name=None, max_people=8, num_keypoints=17, slots=6, max_readers=1, reader=None):
+        slot_arrays = [
+            ("xy", (max_people, num_keypoints, 2), np.float32),
+            ("conf", (max_people, num_keypoints), np.float32),
+            ("info", (4,), np.int64),           # number of people, disp_w, disp_h, roi
+            ("timing", (2,), np.float64),      # timestamp, inference ms
+            ("trace", (len(STAGES),), np.float64),
+        ]
+        shm, created = self._open(name, slots, max_readers, slot_arrays, reader)
+        super().__init__(shm, created, slots, max_readers, slot_arrays, reader)
+        self.max_people = max_people
+        self._last = None
+        self.inference_rate = RateMeter()
+        self.roi_share = 0.0
+
+
+    # write a PoseResult into the ring (used by the inference process)
+    def publish(self, result):
+        n = min(result.xy.shape[0], self.max_people)
+        with self._write_lock:
+            slot = self._next_slot()
+            self._arrays["xy"][slot, :n] = result.xy[:n]
+            self._arrays["conf"][slot, :n] = result.conf[:n]
+            self._arrays["info"][slot] = (n, result.disp_w, result.disp_h, result.roi)
+            self._arrays["timing"][slot] = (result.timestamp, result.inference_ms)
+            self._arrays["trace"][slot] = result.trace if result.trace is not None else np.nan
+            return self._commit(slot)
+
+
+    # same as PoseWorker.latest
+    # the keypoints are copied out of the slot (they're small): holding a new slot releases the old one,
+    # so views into it could be overwritten while the game is still drawing the previous pose
+    def latest(self):
+        seq = int(self._header[_SEQ])
+        if self._last is not None and self._last.seq == seq:
+            return self._last
+        while True:
+            newest = self._wait_newer(self._last.seq if self._last is not None else 0, None)
+            if newest is None:
+                return self._last
+            seq, slot = newest
+
+            # if the writer took the slot before it was held there is an even newer result, so try again
+            if self._hold(slot, seq):
+                break
+
+        n, disp_w, disp_h, roi = (int(v) for v in self._arrays["info"][slot])
+        timestamp, inference_ms = (float(v) for v in self._arrays["timing"][slot])
+        self.inference_rate.tick(inference_ms / 1000.0)
+        self.roi_share = 0.9 * self.roi_share + 0.1 * roi
+        self._last = PoseResult(
+            seq,
+            self._arrays["xy"][slot, :n].copy(),
+            self._arrays["conf"][slot, :n].copy(),
+            disp_w,
+            disp_h,
+            timestamp,
+            inference_ms,
+            bool(roi),
+        )
+
+        # the game adds to the trace, so it gets its own copy
+        self._last.trace = self._arrays["trace"][slot].copy()
+        return self._last
+
+
+    # same as PoseWorker.stats (the rate is of results seen by this reader)
+    def stats(self):
+        stats = super().stats()
+        stats["inference_fps"] = self.inference_rate.rate()
+        stats["inference_ms"] = self.inference_rate.avg_ms()
+        stats["roi_share"] = self.roi_share
+        return stats
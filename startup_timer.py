@@ -0,0 +1,35 @@
+import time
+
+# Prints how long each part of starting up took, so slow startups can be tracked down.
+#
+# Times are measured from when this module was first imported (the first thing app.py does),
+# and printed as each step finishes, e.g.
+#   [startup]   0.41s  window open
+#   [startup]   0.52s  first interactive frame
+#   [startup]   3.87s  pose model loaded (took 3.35s)
+# Each step is only printed the first time it happens.
+# Other processes can use the same starting point, so all the times line up.
+
+class StartupTimer:
+    def __init__(self, origin=None, label=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.label = label
+        self.marks = {}
+
+
+    # record that a step just finished (started: when it began, to also print how long it took)
+    def mark(self, name, started=None):
+        if name in self.marks:
+            return
+        now = time.perf_counter()
+        self.marks[name] = now - self.origin
+
+        line = f"[startup] {now - self.origin:7.2f}s  {name}"
+        if started is not None:
+            line += f" (took {now - started:.2f}s)"
+        if self.label:
+            line += f" [{self.label}]"
+        print(line, flush=True)
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,66 @@
+from ultralytics import YOLO
+import numpy as np
+import time
+import cv2
+
+# Compares pose detection speed and accuracy at different model input sizes.
+# Frames are taken from a local camera, every size is run on the same frame,
+# and the keypoints are compared against the largest size (treated as the "correct" answer).
+# Press 'q' in the window to stop and print the results.
+
+SIZES = [160, 224, 320, 416, 480, 640]
+REFERENCE = max(SIZES)
+
+model = YOLO("yolo11n-pose.pt")
+
+times = {size: [] for size in SIZES}
+errors = {size: [] for size in SIZES}
+
+
+# run the model on the frame shrunk to "size" on the long side
+# and return the first person's keypoints in the original frame's coordinates
+def detect(frame, size):
+    h, w = frame.shape[:2]
+    scale = size / float(max(w, h))
+    resized = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+    start = time.perf_counter()
+    results = model(resized, imgsz=size, verbose=False)
+    elapsed = time.perf_counter() - start
+
+    kpts = results[0].keypoints
+    if kpts is None or kpts.conf is None or kpts.xy.shape[0] == 0:
+        return elapsed, None, None
+    return elapsed, kpts.xy.cpu().numpy()[0] / scale, kpts.conf.cpu().numpy()[0]
+
+
+cap = cv2.VideoCapture(0)
+while True:
+    ret, frame = cap.read()
+    if not ret:
+        break
+
+    reference = None
+    for size in sorted(SIZES, reverse=True):
+        elapsed, xy, conf = detect(frame, size)
+        times[size].append(elapsed)
+        if size == REFERENCE:
+            reference = (xy, conf)
+        elif xy is not None and reference[0] is not None:
+            # average keypoint distance (in frame pixels) for points both sizes are confident in
+            both = (conf > 0.5) & (reference[1] > 0.5)
+            if both.any():
+                errors[size].append(float(np.mean(np.linalg.norm(xy[both] - reference[0][both], axis=1))))
+
+    cv2.imshow("Model input size comparison", frame)
+    if cv2.waitKey(1) & 0xFF == ord("q"):
+        break
+
+cap.release()
+cv2.destroyAllWindows()
+
+print(f"{'size':>6} {'ms':>8} {'error px':>10}")
+for size in SIZES:
+    ms = 1000.0 * np.median(times[size]) if times[size] else float("nan")
+    err = np.mean(errors[size]) if errors[size] else 0.0
+    print(f"{size:>6} {ms:>8.1f} {err:>10.1f}")
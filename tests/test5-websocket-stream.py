@@ -0,0 +1,46 @@
+import cv2
+import json
+import struct
+import time
+import simple_websocket
+
+# Streams frames from a local camera to the game over the /ws websocket,
+# the same way the phone does, and prints the round trip time of every frame.
+# Start the game first (python app.py), then run this. Press 'q' in the window to stop.
+
+URL = "ws://localhost:8080/ws"
+
+ws = simple_websocket.Client.connect(URL)
+settings = {"max_side": 960, "quality": 0.6, "interval_ms": 100}
+
+cap = cv2.VideoCapture(0)
+while True:
+    ret, frame = cap.read()
+    if not ret:
+        break
+
+    # shrink and compress the frame the way the server asked for
+    h, w = frame.shape[:2]
+    scale = min(1.0, settings["max_side"] / float(max(w, h)))
+    if scale < 1.0:
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(settings["quality"] * 100)])
+    if not ok:
+        continue
+    data = jpg.tobytes()
+
+    # send one length prefixed frame and wait for the ack (only one frame in flight)
+    start = time.perf_counter()
+    ws.send(struct.pack(">I", len(data)) + data)
+    reply = json.loads(ws.receive())
+    rtt_ms = 1000.0 * (time.perf_counter() - start)
+    settings = reply["settings"]
+    print(f"frame {reply['ack']}: {len(data) // 1024} KB, round trip {rtt_ms:.1f} ms, next in {settings['interval_ms']} ms")
+
+    cv2.imshow("Websocket stream", frame)
+    if cv2.waitKey(max(1, int(settings["interval_ms"] - rtt_ms))) & 0xFF == ord("q"):
+        break
+
+ws.close()
+cap.release()
+cv2.destroyAllWindows()
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+# Plays a recorded pose trace through the character drawing and the meteor game, with no camera and no YOLO,
+# and checks that two runs with the same meteor seed end up with exactly the same score.
+# Record a trace first by setting POSE_RECORD_PATH in config.py and playing the game, then run this
+# from the project folder:  python tests/test6-pose-trace.py session.poses
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+from game.pose_trace import PoseTraceSource
+from game.draw_character import CharacterDraw, load_sprites
+from game.meteor_game import MeteorGame
+
+TRACE_PATH = sys.argv[1] if len(sys.argv) > 1 else "session.poses"
+SEED = 1234
+FRAMES = 600
+
+pygame.init()
+screen = pygame.display.set_mode((1920, 1080))
+sprites = load_sprites()
+
+# don't wait on the final score screen
+pygame.time.delay = lambda ms: None
+
+
+# play the whole trace once (one pose per frame), returns (score, frames played, seconds taken)
+def play(seed):
+    source = PoseTraceSource(TRACE_PATH, realtime=False, loop=False)
+    character = CharacterDraw(screen, source, 0, 0, 1.0, 0.0, 1.0, True, sprites, clock=source.clock)
+    game = MeteorGame(seed=seed)
+
+    start = time.perf_counter()
+    frames = min(FRAMES, len(source.frames))
+    for frame in range(frames):
+        screen.fill((0, 0, 0))
+        character.draw_character()
+        if frame % 40 == 0:
+            game.spawn_meteor(screen.get_width())
+        if not game.update_and_draw_meteors(screen, character.get_head_rects()):
+            break
+    return game.score, frame + 1, time.perf_counter() - start
+
+
+first = play(SEED)
+second = play(SEED)
+print(f"run 1: score {first[0]} after {first[1]} frames ({1000 * first[2] / first[1]:.2f} ms/frame)")
+print(f"run 2: score {second[0]} after {second[1]} frames ({1000 * second[2] / second[1]:.2f} ms/frame)")
+assert first[:2] == second[:2], f"NOT repeatable: {first[:2]} then {second[:2]}"
+print("repeatable")
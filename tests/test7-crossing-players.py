@@ -0,0 +1,73 @@
+import os
+import sys
+import numpy as np
+
+# Checks the pose tracker keeps giving each player the same id when they get close to each other:
+# - a small child and a bigger player walk past each other
+# - a bigger player steps in right next to the child, just as the child jumps sideways
+#   (matching on keypoint distance alone gave the child's id to the bigger player here,
+#   comparing the sizes of the boxes around their keypoints keeps them apart)
+# Only a few keypoints are confident, the people come back from "YOLO" in a random order every frame,
+# and nothing else (no camera, model or window) is needed:  python tests/test7-crossing-players.py
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game.pose_tracker import PoseTracker
+from game.pose_backends import StubPoseBackend
+
+FPS = 15
+FRAMES = 60
+
+# only the shoulders, hips and knees are confident (like kids in baggy clothes, or a dim room)
+CONFIDENT = [5, 6, 11, 12, 13, 14]
+
+rng = np.random.default_rng(0)
+
+
+# keypoints of a standing person of the given height, centred at x (feet on the floor at y)
+def person(x, height, y=650):
+    xy = (StubPoseBackend.STANDING - [0.5, 0.9]) * height + [x, y]
+    return xy + rng.normal(0, 2, xy.shape)
+
+
+# the child starts on the left and walks right, the bigger player walks the other way
+def crossing(frame):
+    along = frame / float(FRAMES - 1)
+    return [person(300 + 700 * along, 260), person(1000 - 700 * along, 480)]
+
+
+# the child plays alone for a while, then jumps sideways as a bigger player (closer to the camera) steps in
+def stepping_in(frame):
+    if frame < FRAMES // 2:
+        return [person(500, 260)]
+    return [person(560, 260), person(580, 480, 700)]
+
+
+# feed the players to a tracker, failing if a track ever moves from one player to another
+def check(name, players):
+    tracker = PoseTracker()
+    owner = {}
+    for frame in range(FRAMES):
+        t = frame / float(FPS)
+        people = players(frame)
+        order = rng.permutation(len(people))
+        xy = np.stack([people[i] for i in order]).astype(np.float32)
+        conf = np.full((len(people), 17), 0.2, np.float32)
+        conf[:, CONFIDENT] = 0.9
+
+        # which player each track follows now, told apart by their size
+        # (the filtered keypoints lag behind a jump, but the child's stay much smaller)
+        for track in tracker.update(xy, conf, t):
+            if track.last_seen != t:
+                continue
+            filtered = track.filter.predict(t)[CONFIDENT]
+            height = filtered[:, 1].max() - filtered[:, 1].min()
+            player = int(np.argmin([abs(height - (p[CONFIDENT, 1].max() - p[CONFIDENT, 1].min())) for p in people]))
+            assert owner.setdefault(track.id, player) == player, f"{name}: track {track.id} switched players at frame {frame}"
+
+    assert len(owner) == 2, f"{name}: expected 2 tracks, got {len(owner)}"
+    print(f"{name}: both players kept their ids for {FRAMES} frames")
+
+
+check("crossing", crossing)
+check("stepping in", stepping_in)
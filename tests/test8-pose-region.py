@@ -0,0 +1,106 @@
+import os
+import sys
+import numpy as np
+
+# Checks the region of interest pose detection (game/pose_region.py) without a camera or model:
+# - the region is the box around the people plus a margin, and follows the frame if it's decoded at another size
+# - the whole frame is searched every full_every frames, and when the crop loses someone or gets less confident
+# - the pose worker finds the same keypoints searching a region as searching the whole frame,
+#   while giving the model a much smaller image
+# - cropping the sides off in the configuration also gives the model a smaller image, with the people the same size
+# Run from the project folder:  python tests/test8-pose-region.py
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game.pose_region import PoseRegion
+from game.pose_worker import PoseWorker
+from game.pose_backends import StubPoseBackend, FigureBackend
+
+
+# people as keypoints, each standing in the box (x0, y0, x1, y1) in pixels
+def people(*boxes, conf=0.9):
+    xy = np.stack([StubPoseBackend.STANDING * [x1 - x0, y1 - y0] + [x0, y0] for x0, y0, x1, y1 in boxes])
+    return xy.astype(np.float32), np.full((len(boxes), 17), conf, np.float32)
+
+
+# only the settings matter to the worker here, frames are given to it directly
+class Mailbox:
+    decode_min_side = None
+
+
+# a child sized figure, moving right a little every frame
+def frame(i, size=(1280, 720)):
+    w, h = size
+    image = np.zeros((h, w, 3), np.uint8)
+    x = int((0.4 + 0.005 * i) * w)
+    image[int(0.15 * h):int(0.95 * h), x:x + int(0.18 * w)] = 255
+    return image
+
+
+W, H = 1280, 720
+
+# the first frame is always searched whole, then only around the person
+region = PoseRegion(margin=0.3, full_every=5)
+assert region.next_region(W, H) is None
+region.update(*people((500, 100, 700, 650)), None, W, H)
+x0, y0, x1, y1 = region.next_region(W, H)
+assert x0 < 500 and y0 < 100 and x1 > 700 and y1 > 650, "the region has to cover the person"
+assert (x1 - x0) * (y1 - y0) < 0.6 * W * H, "the region should be smaller than the frame"
+
+# the same region, for a frame decoded at half the size
+half = region.next_region(W // 2, H // 2)
+assert all(abs(a / 2 - b) <= 1 for a, b in zip((x0, y0, x1, y1), half)), f"{half} isn't half of {(x0, y0, x1, y1)}"
+
+# the whole frame again after full_every frames
+for _ in range(5):
+    assert region.next_region(W, H) is not None
+    region.update(*people((500, 100, 700, 650)), (x0, y0, x1, y1), W, H)
+assert region.next_region(W, H) is None
+
+# the whole frame again when the region loses someone the whole frame found
+region.update(*people((300, 100, 450, 650), (600, 100, 750, 650)), None, W, H)
+crop = region.next_region(W, H)
+assert crop is not None
+region.update(*people((300, 100, 450, 650)), crop, W, H)
+assert region.next_region(W, H) is None, "a lost person should bring back a whole frame search"
+
+# the whole frame again when the keypoints get a lot less confident
+region.update(*people((500, 100, 700, 650), conf=0.9), None, W, H)
+crop = region.next_region(W, H)
+region.update(*people((500, 100, 700, 650), conf=0.7), crop, W, H)
+assert region.next_region(W, H) is None, "a confidence drop should bring back a whole frame search"
+
+# same keypoints searching regions as searching the whole frame, with a frame decoded at half size in the middle
+results = {}
+for roi in (False, True):
+    backend = FigureBackend()
+    worker = PoseWorker(backend, Mailbox(), 1.5, True, 0.1, 0.9, roi=roi)
+    results[roi] = []
+    for i in range(30):
+        size = (640, 360) if 10 <= i < 15 else (W, H)
+        result = worker.process_frame(i + 1, frame(i, size), {"src_w": W, "src_h": H})
+        results[roi].append(result)
+    pixels = np.mean([h * w for h, w in backend.sizes])
+    print(f"{'region' if roi else 'whole frame'}: {pixels:.0f} pixels searched per frame on average")
+
+    if roi:
+        assert sum(r.roi for r in results[roi]) >= 20, "most frames should have searched a region"
+        assert pixels < 0.6 * backend.sizes[0][0] * backend.sizes[0][1], "regions should be much smaller than the frame"
+
+error = max(float(np.abs(a.xy - b.xy).max()) for a, b in zip(results[False], results[True]))
+print(f"largest keypoint difference: {error:.1f} display pixels")
+assert error < 4.0, "searching a region should find the same keypoints"
+
+# cropping the sides off: the people stay the same size to the model, the image around them gets narrower
+sizes = {}
+for crop in ((0.0, 1.0), (0.25, 0.75)):
+    backend = FigureBackend()
+    worker = PoseWorker(backend, Mailbox(), 1.5, True, *crop, roi=False)
+    results[crop] = worker.process_frame(1, frame(0), {"src_w": W, "src_h": H})
+    sizes[crop] = backend.sizes[0]
+print(f"model image {sizes[0.0, 1.0]} for the whole frame, {sizes[0.25, 0.75]} with half of it cropped off")
+assert sizes[0.25, 0.75][0] == sizes[0.0, 1.0][0], "cropping the sides shouldn't change the people's size to the model"
+assert sizes[0.25, 0.75][1] <= sizes[0.0, 1.0][1] // 2 + 1, "cropping the sides should make the model image narrower"
+error = float(np.abs(results[0.0, 1.0].xy - results[0.25, 0.75].xy).max())
+assert error < 4.0, "cropping the sides shouldn't move the keypoints"
+print("ok")
@@ -0,0 +1,74 @@
+import threading
+import time
+from config import MODEL_INPUT_SIZE
+
+# Works out what the phone should be sending, based on how fast the computer is keeping up.
+#
+# The phone used to send a full resolution jpeg every 100ms no matter what, even though
+# the frames get shrunk right away and most of them are replaced before they are ever used.
+# The server now advertises (at /stream_settings) a frame size, jpeg quality and frame rate:
+# - frame rate: a little faster than frames are actually being used (by pose detection or the
+#   configuration preview), so there is always a fresh frame waiting but few are wasted
+# - size and quality: smaller when decoding frames is slow
+# The phone also only ever has one upload in flight, which is the other half of not flooding the server.
+# Flask serves requests on many threads, so the consume rate sample is only touched under a lock.
+
+class UploadAdvisor:
+    MIN_FPS = 4
+    MAX_FPS = 30
+    DEFAULT_FPS = 10
+
+    # long side of uploaded frames: enough for the preview and for inference after cropping
+    MAX_SIDE = max(960, 3 * MODEL_INPUT_SIZE)
+    MIN_SIDE = max(480, 2 * MODEL_INPUT_SIZE)
+
+    # decoding slower than this (ms) is treated as slow
+    SLOW_DECODE_MS = 12.0
+
+    def __init__(self, decode_meter):
+        self.decode_meter = decode_meter
+        self._sample = None
+        self._lock = threading.Lock()
+        self.consume_fps = 0.0
+
+
+    # how many frames a second are being taken out of the mailbox
+    # (measured between calls, at least a second apart, so it changes smoothly), returns the rate
+    def _update_consume_rate(self, mailbox):
+        takes = mailbox.stats()["takes"]
+        with self._lock:
+            now = time.perf_counter()
+            if self._sample is None:
+                self._sample = (now, takes)
+                return self.consume_fps
+            last_time, last_takes = self._sample
+            if now - last_time >= 1.0:
+                self.consume_fps = (takes - last_takes) / (now - last_time)
+                self._sample = (now, takes)
+            return self.consume_fps
+
+
+    # settings sent to the phone, for frames being put into this mailbox
+    def settings(self, mailbox):
+        consume_fps = self._update_consume_rate(mailbox)
+        decode_ms = self.decode_meter.avg_ms()
+
+        # upload a bit faster than frames are used, so there is always a new one waiting
+        if consume_fps > 0:
+            fps = consume_fps * 1.25
+        else:
+            fps = self.DEFAULT_FPS
+
+        # decoding shouldn't take up more than half of the time between frames
+        if decode_ms > 0:
+            fps = min(fps, 500.0 / decode_ms)
+        fps = max(self.MIN_FPS, min(self.MAX_FPS, fps))
+
+        slow = decode_ms > self.SLOW_DECODE_MS
+        return {
+            "max_side": self.MIN_SIDE if slow else self.MAX_SIDE,
+            "quality": 0.5 if slow else 0.6,
+            "interval_ms": int(round(1000.0 / fps)),
+            "consume_fps": round(consume_fps, 1),
+            "decode_ms": round(decode_ms, 1),
+        }
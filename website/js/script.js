@@ -38,21 +38,94 @@ document.addEventListener("DOMContentLoaded", () => {
     .catch(err => alert(err));
   }
 
+  // what the server wants us to send (it changes these depending on how well it keeps up)
+  let settings = { max_side: 960, quality: 0.6, interval_ms: 100 };
+
+  // when streaming, the settings come with every ack instead
+  function refreshSettings() {
+    if (streamSocket) return;
+    fetch("/stream_settings")
+      .then(res => res.json())
+      .then(s => { settings = s; })
+      .catch(() => {});
+  }
+
+  // frames are streamed over a websocket when possible (much less overhead per frame through the tunnel),
+  // falling back to one POST per frame if the websocket isn't available
+  let streamSocket = null;
+  let pendingAck = null;
+
+  function ackReceived() {
+    if (pendingAck) {
+      pendingAck();
+      pendingAck = null;
+    }
+  }
+
+  function connectStream() {
+    const protocol = location.protocol === "https:" ? "wss:" : "ws:";
+    const socket = new WebSocket(`${protocol}//${location.host}/ws`);
+    socket.onopen = () => { streamSocket = socket; };
+    socket.onmessage = event => {
+      settings = JSON.parse(event.data).settings;
+      ackReceived();
+    };
+    socket.onclose = () => {
+      streamSocket = null;
+      ackReceived();
+      setTimeout(connectStream, 2000);
+    };
+  }
+
+  // send one length prefixed frame (4 byte big endian length, then the jpeg) and wait for the ack
+  function streamFrame(blob) {
+    const header = new DataView(new ArrayBuffer(4));
+    header.setUint32(0, blob.size);
+    return new Promise(resolve => {
+      pendingAck = resolve;
+      streamSocket.send(new Blob([header.buffer, blob]));
+
+      // don't wait forever if an ack gets lost
+      setTimeout(() => { if (pendingAck === resolve) ackReceived(); }, 2000);
+    });
+  }
+
+  function postFrame(blob) {
+    return fetch("/upload", {
+      method: "POST",
+      body: blob
+    });
+  }
+
+  // capture the current video frame (shrunk to the size the server asked for) and send it
+  // resolves once the upload has finished (or been acked), so only one upload is ever in flight
+  function sendFrame() {
+    if (!video.videoWidth) return Promise.resolve();
+
+    const scale = Math.min(1, settings.max_side / Math.max(video.videoWidth, video.videoHeight));
+    canvas.width = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
+    ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+
+    return new Promise(resolve => canvas.toBlob(resolve, "image/jpeg", settings.quality))
+      .then(blob => streamSocket ? streamFrame(blob) : postFrame(blob))
+      .catch(() => {});
+  }
+
   // Upload loop
-  setInterval(() => {
-    if (!video.videoWidth) return;
-
-    canvas.width = video.videoWidth;
-    canvas.height = video.videoHeight;
-    ctx.drawImage(video, 0, 0);
-
-    canvas.toBlob(blob => {
-      fetch("/upload", {
-        method: "POST",
-        body: blob
-      });
-    }, "image/jpeg", 0.6);
-  }, 100);
+  // waits for each upload to finish, then for whatever is left of the interval, before sending the next
+  function uploadLoop() {
+    const started = performance.now();
+    sendFrame().finally(() => {
+      const wait = Math.max(0, settings.interval_ms - (performance.now() - started));
+      setTimeout(uploadLoop, wait);
+    });
+  }
+
+  refreshSettings();
+  setInterval(refreshSettings, 2000);
+  connectStream();
+  uploadLoop();
 
   switchBtn.addEventListener("click", () => {
     facingMode = facingMode === "environment" ? "user" : "environment";